@@ -1,28 +1,679 @@
-"""A simple bitarray class."""
+"""A simple bitarray class, a variant backed by a memory-mapped file, a
+rank/select directory for bitarrays and a packed array of 4-bit values."""
+import mmap
+import re
+from array import array
+from bisect import bisect_right
+from collections.abc import Callable, Iterable, Iterator
+from operator import and_, or_, xor
+from os import PathLike
+from types import TracebackType
+from typing import Any, Optional, Self, TypeAlias, overload
+
+# Objects exporting a (contiguous) buffer of bytes.
+Buffer: TypeAlias = "bytes | bytearray | memoryview | mmap.mmap | array[Any]"
+
+# Bulk operations convert the underlying bytes to Python ints in chunks of this
+# many bytes, so the per-bit work is done in C instead of in the interpreter,
+# while the temporary ints stay reasonably small.
+_CHUNK_SIZE = 1 << 16
+
+# Runs of (at most 8) non-zero bytes. The regex engine skips zero bytes at C
+# speed, so scanning a sparse BitArray costs time proportional to the number
+# of non-zero bytes, not to the number of bits.
+_NON_ZERO_BYTES = re.compile(rb"[^\x00]{1,8}")
+
+# For every byte value, the nr of its 4-bit halves that are not 0.
+_NR_NONZERO_NIBBLES = bytes((byte & 0xf != 0) + (byte >> 4 != 0)
+                            for byte in range(256))
+
+
+def iter_set_bits(data: Buffer) -> Iterator[int]:
+	"""Yield the offsets of all set bits in data (bit i in byte i // 8, at
+	bit position i % 8), in ascending order. Runs of zero bytes are skipped
+	by the regex engine, so this takes time proportional to the nr of
+	non-zero bytes rather than to the size of data."""
+
+	for match in _NON_ZERO_BYTES.finditer(data):
+		value = int.from_bytes(match.group(), "little")
+		base = 8 * match.start()
+		while value:
+			lowest_bit = value & -value
+			yield base + lowest_bit.bit_length() - 1
+			value ^= lowest_bit
 
 
 class BitArray:
 	"""A (very) simple bitarray class. All bits are initialized to 0. Bits can
-	be set and read using indexing, and len() is supported."""
+	be set and read using indexing, and len() is supported. Whole-array
+	operations (&, |, ^, ~, count, any, all, fill) work on the underlying bytes
+	in bulk.
 	
+	Bit i is stored in byte i // 8, at bit position i % 8 (so the bytes are
+	'little endian' per bit). view() returns a memoryview of these bytes
+	(without copying), to_bytes() returns a copy, and from_bytes() and
+	frombuffer() create a BitArray from existing bytes (with, respectively
+	without copying them). On Python 3.12+, BitArray also supports the buffer
+	protocol directly, e.g. memoryview(bit_array).
+
+	Invariant: the unused (padding) bits in the last byte are always 0."""
+
 	def __init__(self, nr_bits: int) -> None:
-		self.__nr_bits = nr_bits
-		self.__data = bytearray(0 for _ in range((nr_bits + 7) // 8))
+		self._nr_bits = nr_bits
+		self._data: bytearray | memoryview = bytearray((nr_bits + 7) // 8)
 
-	def __getitem__(self, bit_nr: int) -> bool:
-		byte_offset, bit_offset = divmod(bit_nr, 8)
-		return bool(self.__data[byte_offset] & (1 << bit_offset))
-	
-	def __setitem__(self, bit_nr: int, bit_value: bool) -> None:
-		byte_offset, bit_offset = divmod(bit_nr, 8)
+	@staticmethod
+	def __check_nr_bits(nr_bits: Optional[int], nr_bytes: int) -> int:
+		"""Return nr_bits, or the nr of bits in nr_bytes if nr_bits is None.
+		Raises ValueError if nr_bits does not fit in nr_bytes."""
+
+		if nr_bits is None:
+			return 8 * nr_bytes
+		if not 0 <= nr_bits <= 8 * nr_bytes:
+			raise ValueError(f"Cannot store {nr_bits} bits in {nr_bytes} "
+			                 f"bytes.")
+		return nr_bits
+
+	@staticmethod
+	def from_bytes(data: Buffer, nr_bits: Optional[int] = None) \
+		-> "BitArray":
+		"""Return a new BitArray of nr_bits bits (by default: all bits in
+		data) initialized with a copy of the first (nr_bits + 7) // 8 bytes of
+		data. Bits in data beyond nr_bits are ignored."""
+
+		view = memoryview(data).cast("B")
+		bit_array = BitArray(BitArray.__check_nr_bits(nr_bits, len(view)))
+		bit_array._data[:] = view[:len(bit_array._data)]
+		bit_array.__clear_padding()
+		return bit_array
+
+	@staticmethod
+	def frombuffer(buffer: Buffer, nr_bits: Optional[int] = None) \
+		-> "BitArray":
+		"""Return a BitArray of nr_bits bits (by default: all bits in buffer)
+		that uses the first (nr_bits + 7) // 8 bytes of buffer as its storage,
+		without copying them: changes to the BitArray change buffer, and vice
+		versa. If buffer is read-only, setting bits raises TypeError. Bits in
+		buffer beyond nr_bits (in the last byte used) must be 0."""
+
+		view = memoryview(buffer).cast("B")
+		bit_array = BitArray(0)
+		bit_array._nr_bits = BitArray.__check_nr_bits(nr_bits, len(view))
+		bit_array._data = view[:(bit_array._nr_bits + 7) // 8]
+		return bit_array
+
+	def to_bytes(self) -> bytes:
+		"""Return a copy of the underlying bytes."""
+
+		return bytes(self._data)
+
+	def __bytes__(self) -> bytes:
+		return self.to_bytes()
+
+	def view(self) -> memoryview:
+		"""Return a memoryview of the underlying bytes (no copy)."""
+
+		return memoryview(self._data)
+
+	def __buffer__(self, flags: int) -> memoryview:
+		"""Buffer protocol support (PEP 688, Python 3.12+)."""
+
+		return memoryview(self._data)
+
+	def __release_buffer__(self, view: memoryview) -> None:
+		view.release()
+
+	@overload
+	def __getitem__(self, key: int) -> bool:
+		...
+
+	@overload
+	def __getitem__(self, key: slice) -> "BitArray":
+		...
+
+	def __getitem__(self, key: int | slice) -> "bool | BitArray":
+		"""Return the bit at index key, or a new BitArray with the bits in
+		slice key."""
+
+		if isinstance(key, slice):
+			return self.__get_slice(key)
+		byte_offset, bit_offset = divmod(key, 8)
+		return bool(self._data[byte_offset] & (1 << bit_offset))
+
+	@overload
+	def __setitem__(self, key: int, value: bool) -> None:
+		...
+
+	@overload
+	def __setitem__(self, key: slice,
+	                value: "bool | BitArray | Iterable[bool]") -> None:
+		...
+
+	def __setitem__(self, key: int | slice,
+	                value: "bool | BitArray | Iterable[bool]") -> None:
+		"""Set the bit at index key to value. If key is a slice, value is
+		either a single bool (which is assigned to all bits in the slice), or
+		a BitArray or iterable of bools with exactly one value per bit in the
+		slice (the length of a BitArray cannot change)."""
+
+		if isinstance(key, slice):
+			self.__set_slice(key, value)
+			return
+		byte_offset, bit_offset = divmod(key, 8)
 		mask = 1 << bit_offset
-		if bit_value:
-			self.__data[byte_offset] |= mask
+		if value:
+			self._data[byte_offset] |= mask
+		else:
+			self._data[byte_offset] &= ~mask
+
+	def __get_slice(self, key: slice) -> "BitArray":
+		start, stop, step = key.indices(self._nr_bits)
+		bit_range = range(start, stop, step)
+		result = BitArray(len(bit_range))
+		if not bit_range:
+			return result
+
+		if step == 1:
+			first_byte, last_byte = start // 8, (stop + 7) // 8
+			value = ((int.from_bytes(self._data[first_byte:last_byte], "little")
+			          >> (start - 8 * first_byte))
+			         & ((1 << len(result)) - 1))
+			result._data[:] = value.to_bytes(len(result._data), "little")
 		else:
-			self.__data[byte_offset] &= ~mask
+			for result_bit_nr, bit_nr in enumerate(bit_range):
+				if self[bit_nr]:
+					result[result_bit_nr] = True
+		return result
+
+	def __set_slice(self, key: slice,
+	                value: "bool | BitArray | Iterable[bool]") -> None:
+		start, stop, step = key.indices(self._nr_bits)
+		bit_range = range(start, stop, step)
+
+		if isinstance(value, (bool, int)):
+			if not bit_range:
+				return
+			if step == 1:
+				self.fill(start, stop, bool(value))
+			else:
+				for bit_nr in bit_range:
+					self[bit_nr] = value
+			return
+
+		bits = value if isinstance(value, BitArray) else list(value)
+		if len(bits) != len(bit_range):
+			raise ValueError(f"Cannot assign {len(bits)} bits to a slice of "
+			                 f"{len(bit_range)} bits.")
+		if not bit_range:
+			return
+
+		if step == 1 and isinstance(bits, BitArray):
+			first_byte, last_byte = start // 8, (stop + 7) // 8
+			shift = start - 8 * first_byte
+			mask = ((1 << len(bit_range)) - 1) << shift
+			current = int.from_bytes(self._data[first_byte:last_byte], "little")
+			new = ((current & ~mask)
+			       | (int.from_bytes(bits._data, "little") << shift))
+			self._data[first_byte:last_byte] = \
+				new.to_bytes(last_byte - first_byte, "little")
+		else:
+			for index, bit_nr in enumerate(bit_range):
+				self[bit_nr] = bits[index]
 
 	def __len__(self) -> int:
-		return self.__nr_bits
+		return self._nr_bits
+
+	def __eq__(self, other: Any) -> bool:
+		"""Return True if other is a BitArray with the same length and the
+		same bits set, else False."""
+
+		if not isinstance(other, BitArray):
+			return NotImplemented
+		return (self._nr_bits == other._nr_bits
+		        and self._data == other._data)
+
+	def _chunks(self) -> Iterator[tuple[int, int]]:
+		"""Yield (start, stop) byte offsets of consecutive chunks of the
+		underlying data."""
+
+		nr_bytes = len(self._data)
+		for start in range(0, nr_bytes, _CHUNK_SIZE):
+			yield start, min(start + _CHUNK_SIZE, nr_bytes)
+
+	def __clear_padding(self) -> None:
+		"""Reset the unused bits in the last byte to 0."""
+
+		if nr_padding_bits := -self._nr_bits % 8:
+			self._data[-1] &= 0xff >> nr_padding_bits
+
+	def __bulk_op(self, other: "BitArray", target: "BitArray",
+	              op: Callable[[int, int], int]) -> "BitArray":
+		"""Store op(self, other) in target (which may be self), chunk by chunk.
+		Return target."""
+
+		if self._nr_bits != other._nr_bits:
+			raise ValueError(f"BitArrays of different lengths "
+			                 f"({self._nr_bits} and {other._nr_bits}).")
+
+		for start, stop in self._chunks():
+			value = op(int.from_bytes(self._data[start:stop], "little"),
+			           int.from_bytes(other._data[start:stop], "little"))
+			target._data[start:stop] = value.to_bytes(stop - start, "little")
+		return target
+
+	def __and__(self, other: Any) -> "BitArray":
+		if not isinstance(other, BitArray):
+			return NotImplemented
+		return self.__bulk_op(other, BitArray(self._nr_bits), and_)
+
+	def __or__(self, other: Any) -> "BitArray":
+		if not isinstance(other, BitArray):
+			return NotImplemented
+		return self.__bulk_op(other, BitArray(self._nr_bits), or_)
+
+	def __xor__(self, other: Any) -> "BitArray":
+		if not isinstance(other, BitArray):
+			return NotImplemented
+		return self.__bulk_op(other, BitArray(self._nr_bits), xor)
+
+	def __iand__(self, other: Any) -> "BitArray":
+		if not isinstance(other, BitArray):
+			return NotImplemented
+		return self.__bulk_op(other, self, and_)
+
+	def __ior__(self, other: Any) -> "BitArray":
+		if not isinstance(other, BitArray):
+			return NotImplemented
+		return self.__bulk_op(other, self, or_)
+
+	def __ixor__(self, other: Any) -> "BitArray":
+		if not isinstance(other, BitArray):
+			return NotImplemented
+		return self.__bulk_op(other, self, xor)
+
+	def __invert__(self) -> "BitArray":
+		"""Return a new BitArray with all bits flipped."""
+
+		result = BitArray(self._nr_bits)
+		for start, stop in self._chunks():
+			nr_bytes = stop - start
+			value = (int.from_bytes(self._data[start:stop], "little")
+			         ^ ((1 << (8 * nr_bytes)) - 1))
+			result._data[start:stop] = value.to_bytes(nr_bytes, "little")
+		result.__clear_padding()
+		return result
+
+	def count(self) -> int:
+		"""Return the number of bits set to 1."""
+
+		return sum(int.from_bytes(self._data[start:stop], "little").bit_count()
+		           for start, stop in self._chunks())
+
+	def any(self) -> bool:
+		"""Return True if at least one bit is set, else False."""
+
+		return any(int.from_bytes(self._data[start:stop], "little")
+		           for start, stop in self._chunks())
+
+	def all(self) -> bool:
+		"""Return True if all bits are set (or if there are no bits at all),
+		else False."""
+
+		nr_full_bytes, nr_tail_bits = divmod(self._nr_bits, 8)
+		for start in range(0, nr_full_bytes, _CHUNK_SIZE):
+			stop = min(start + _CHUNK_SIZE, nr_full_bytes)
+			if (int.from_bytes(self._data[start:stop], "little")
+			        != (1 << (8 * (stop - start))) - 1):
+				return False
+
+		tail_mask = (1 << nr_tail_bits) - 1
+		return (not nr_tail_bits
+		        or self._data[nr_full_bytes] & tail_mask == tail_mask)
+
+	def set_bits(self, bit_nrs: Iterable[int]) -> None:
+		"""Set all bits in bit_nrs to 1. Much faster than setting them one at
+		a time using indexing."""
+
+		data = self._data
+		for bit_nr in bit_nrs:
+			data[bit_nr >> 3] |= 1 << (bit_nr & 7)
+
+	def all_set(self, bit_nrs: Iterable[int]) -> bool:
+		"""Return True if all bits in bit_nrs are 1, else False (stops at the
+		first bit that is 0)."""
+
+		data = self._data
+		return all(data[bit_nr >> 3] & (1 << (bit_nr & 7))
+		           for bit_nr in bit_nrs)
+
+	def iter_set(self) -> Iterator[int]:
+		"""Yield the indices of all set bits, in ascending order. Zero bytes
+		are skipped in bulk, so this is fast for sparse BitArrays."""
+
+		return iter_set_bits(self._data)
+
+	def find_next(self, offset: int = 0) -> int:
+		"""Return the index of the first set bit at or after offset, or -1 if
+		there is no such bit. A negative offset is treated as 0."""
+
+		offset = max(offset, 0)
+		if offset >= self._nr_bits:
+			return -1
+
+		byte_offset, bit_offset = divmod(offset, 8)
+		if first_byte := self._data[byte_offset] >> bit_offset:
+			return offset + (first_byte & -first_byte).bit_length() - 1
+
+		if match := _NON_ZERO_BYTES.search(self._data, byte_offset + 1):
+			byte = match.group()[0]
+			return 8 * match.start() + (byte & -byte).bit_length() - 1
+		return -1
+
+	def find_prev(self, offset: int) -> int:
+		"""Return the index of the last set bit at or before offset, or -1 if
+		there is no such bit. An offset >= len(self) is treated as
+		len(self) - 1."""
+
+		offset = min(offset, self._nr_bits - 1)
+		if offset < 0:
+			return -1
+
+		byte_offset, bit_offset = divmod(offset, 8)
+		if last_byte := self._data[byte_offset] & ((2 << bit_offset) - 1):
+			return 8 * byte_offset + last_byte.bit_length() - 1
+
+		for stop in range(byte_offset, 0, -_CHUNK_SIZE):
+			start = max(stop - _CHUNK_SIZE, 0)
+			if value := int.from_bytes(self._data[start:stop], "little"):
+				return 8 * start + value.bit_length() - 1
+		return -1
+
+	def fill(self, start: int, stop: int, value: bool = True) -> None:
+		"""Set all bits in range(start, stop) to value. Whole bytes are set in
+		one go, only the (at most 14) bits in partial bytes at either end are
+		set one at a time. Raises IndexError if not
+		0 <= start <= stop <= len(self)."""
+
+		if not 0 <= start <= stop <= self._nr_bits:
+			raise IndexError(f"Invalid range({start}, {stop}) for BitArray "
+			                 f"of length {self._nr_bits}.")
+
+		first_full_byte = (start + 7) // 8
+		last_full_byte = stop // 8
+		if first_full_byte >= last_full_byte:
+			for bit_nr in range(start, stop):
+				self[bit_nr] = value
+			return
+
+		for bit_nr in range(start, 8 * first_full_byte):
+			self[bit_nr] = value
+		self._data[first_full_byte:last_full_byte] = \
+			(b"\xff" if value else b"\x00") * (last_full_byte - first_full_byte)
+		for bit_nr in range(8 * last_full_byte, stop):
+			self[bit_nr] = value
+
+
+class MmapBitArray(BitArray):
+	"""A BitArray whose bits live in a memory-mapped file instead of in RAM.
+	The OS pages the bits in (and out) on demand, so opening even a huge
+	prebuilt bitmap is instant, and several processes opening the same file
+	read-only share one copy of it.
+
+	Modes (like the corresponding file modes):
+	- "r": open an existing file read-only (setting bits raises TypeError),
+	- "r+": open an existing file for reading and writing,
+	- "w+": create (or truncate) the file, with all nr_bits bits set to 0.
+	The bits start at byte offset in the file. If nr_bits is None (not
+	allowed for "w+"), all bytes from offset to the end of the file are used.
+	Bits beyond nr_bits in the last byte are expected to be 0.
+	
+	Changes are written back to the file by flush() and close(). The object
+	can be used as a context manager, which closes it on exit."""
+
+	_ACCESS_MODES = {"r": mmap.ACCESS_READ,
+	                 "r+": mmap.ACCESS_WRITE,
+	                 "w+": mmap.ACCESS_WRITE}
+
+	def __init__(self,
+	             filename: str | PathLike[str],
+	             nr_bits: Optional[int] = None,
+	             mode: str = "r",
+	             offset: int = 0) -> None:
+		if mode not in self._ACCESS_MODES:
+			raise ValueError(f"Invalid mode {mode!r} (must be one of "
+			                 f"{', '.join(self._ACCESS_MODES)}).")
+
+		if mode == "w+":
+			if nr_bits is None:
+				raise ValueError("nr_bits is required when creating a file.")
+			with open(filename, "wb") as file:
+				file.truncate(offset + (nr_bits + 7) // 8)
+
+		with open(filename, "rb" if mode == "r" else "r+b") as file:
+			file.seek(0, 2)
+			# An empty file cannot be mapped (nor hold any bits).
+			self.__mmap = (mmap.mmap(file.fileno(), 0,
+			                         access=self._ACCESS_MODES[mode])
+			               if file.tell() else None)
+
+		nr_bytes_available = (len(self.__mmap) if self.__mmap else 0) - offset
+		if nr_bits is None:
+			nr_bits = 8 * max(nr_bytes_available, 0)
+		elif (nr_bits + 7) // 8 > nr_bytes_available:
+			if self.__mmap is not None:
+				self.__mmap.close()
+			raise ValueError(f"{filename} is too small for {nr_bits} bits at "
+			                 f"offset {offset}.")
+
+		self._nr_bits = nr_bits
+		self.__offset = offset
+		self.__closed = False
+		self._data = self.__view()
+		self.__writable = mode != "r"
+
+	def __view(self) -> memoryview:
+		"""Return a memoryview of the bits in the mapping."""
+
+		if self.__mmap is None:
+			return memoryview(bytearray())
+		return memoryview(self.__mmap)[self.__offset:
+		                               self.__offset
+		                               + (self._nr_bits + 7) // 8]
+
+	def __enter__(self) -> Self:
+		return self
+
+	def __exit__(self,
+	             exc_type: Optional[type[BaseException]],
+	             exc_value: Optional[BaseException],
+	             traceback: Optional[TracebackType]) -> None:
+		self.close()
+
+	@property
+	def closed(self) -> bool:
+		"""Return True if the mapping has been closed, else False."""
+
+		return self.__closed
+
+	def flush(self) -> None:
+		"""Write changed bits back to the file (no-op for read-only)."""
+
+		if self.__writable and self.__mmap is not None:
+			self.__mmap.flush()
+
+	def close(self) -> None:
+		"""Flush and unmap the file. The object can no longer be used after
+		closing it. Closing a closed MmapBitArray has no effect. Raises
+		BufferError (and stays open) while a view() of it is still in use."""
+
+		if self.__closed:
+			return
+		self.flush()
+		data = self._data
+		if isinstance(data, memoryview):
+			data.release()
+		if self.__mmap is not None:
+			try:
+				self.__mmap.close()
+			except BufferError:
+				self._data = self.__view()
+				raise
+		self.__closed = True
+
+
+class NibbleArray:
+	"""An array of size 4-bit unsigned ints (0 up to and including 15), packed
+	two per byte, all initialized to 0. Values can be set and read using
+	indexing, and len() is supported."""
+
+	MAX_VALUE = 15
+
+	def __init__(self, size: int) -> None:
+		self.__size = size
+		self.__data = bytearray((size + 1) // 2)
+
+	@staticmethod
+	def from_bytes(data: Buffer, size: int) -> "NibbleArray":
+		"""Return a new NibbleArray of size values initialized with a copy of
+		the first (size + 1) // 2 bytes of data, e.g. as returned by view()."""
+
+		nibble_array = NibbleArray(size)
+		view = memoryview(data).cast("B")[:len(nibble_array.__data)]
+		if len(view) != len(nibble_array.__data):
+			raise ValueError(f"{len(view)} bytes is too few for {size} "
+			                 f"values.")
+		nibble_array.__data[:] = view
+		if size % 2:
+			nibble_array.__data[-1] &= 0xf
+		return nibble_array
+
+	def view(self) -> memoryview:
+		"""Return a memoryview of the underlying bytes (no copy)."""
+
+		return memoryview(self.__data)
+
+	def __getitem__(self, index: int) -> int:
+		return (self.__data[index >> 1] >> ((index & 1) << 2)) & 0xf
+
+	def __setitem__(self, index: int, value: int) -> None:
+		if not 0 <= value <= self.MAX_VALUE:
+			raise ValueError(f"NibbleArray value must be in range(16), "
+			                 f"not {value}.")
+		byte_offset, shift = index >> 1, (index & 1) << 2
+		self.__data[byte_offset] = ((self.__data[byte_offset] & (0xf0 >> shift))
+		                            | (value << shift))
+
+	def __len__(self) -> int:
+		return self.__size
+
+	@property
+	def nbytes(self) -> int:
+		"""Return the nr of bytes used to store the values."""
+
+		return len(self.__data)
+
+	def count_nonzero(self) -> int:
+		"""Return the nr of values that are not 0."""
+
+		# Map every byte to the nr of its non-zero nibbles (0, 1 or 2).
+		nr_nonzero = self.__data.translate(_NR_NONZERO_NIBBLES)
+		return nr_nonzero.count(1) + 2 * nr_nonzero.count(2)
+
+
+class RankSelect:
+	"""A rank/select directory over a BitArray:
+	- rank(i) returns the number of set bits before index i, in O(1),
+	- select(k) returns the index of the k-th (0-based) set bit, in
+	  O(log n).
+	The directory stores the cumulative popcount at the start of every block
+	of BLOCK_SIZE bits (64 bits per block, about 3% of the size of the bit
+	array). It reflects the bits at the time of the last (re)build, so after
+	changing bits in range(start, stop), call rebuild(start, stop): only the
+	blocks overlapping that range are recounted."""
+
+	BLOCK_SIZE = 2048
+	_BLOCK_BYTES = BLOCK_SIZE // 8
+	_WORD_BYTES = 8
+
+	def __init__(self, bit_array: BitArray) -> None:
+		self.__bit_array = bit_array
+		nr_blocks = (len(bit_array) + self.BLOCK_SIZE - 1) // self.BLOCK_SIZE
+		# __cumulative[b] is the nr of set bits in all blocks before block b,
+		# so __cumulative[-1] is the total nr of set bits.
+		self.__cumulative = array("Q", bytes(8 * (nr_blocks + 1)))
+		self.rebuild()
+
+	def __block_bytes(self, block_nr: int) -> bytearray | memoryview:
+		start = block_nr * self._BLOCK_BYTES
+		return self.__bit_array._data[start:start + self._BLOCK_BYTES]
+
+	def rebuild(self, start: int = 0, stop: Optional[int] = None) -> None:
+		"""Update the directory after bits in range(start, stop) changed (by
+		default: rebuild it completely)."""
+
+		if stop is None:
+			stop = len(self.__bit_array)
+		if not 0 <= start <= stop <= len(self.__bit_array):
+			raise IndexError(f"Invalid range({start}, {stop}) for BitArray "
+			                 f"of length {len(self.__bit_array)}.")
+
+		cumulative = self.__cumulative
+		first_block = start // self.BLOCK_SIZE
+		last_block = (stop + self.BLOCK_SIZE - 1) // self.BLOCK_SIZE
+		old_total = cumulative[last_block]
+		total = cumulative[first_block]
+		for block_nr in range(first_block, last_block):
+			total += int.from_bytes(self.__block_bytes(block_nr),
+			                        "little").bit_count()
+			cumulative[block_nr + 1] = total
+
+		# Blocks after the changed range keep their counts, but are shifted.
+		if delta := total - old_total:
+			for block_nr in range(last_block + 1, len(cumulative)):
+				cumulative[block_nr] += delta
+
+	def count(self) -> int:
+		"""Return the total number of set bits."""
+
+		return self.__cumulative[-1]
+
+	def rank(self, index: int) -> int:
+		"""Return the number of set bits in range(index). Raises IndexError if
+		not 0 <= index <= len(bit_array)."""
+
+		if not 0 <= index <= len(self.__bit_array):
+			raise IndexError(f"rank index {index} out of range.")
+
+		block_nr, bit_nr = divmod(index, self.BLOCK_SIZE)
+		result = self.__cumulative[block_nr]
+		if bit_nr:
+			value = int.from_bytes(self.__block_bytes(block_nr), "little")
+			result += (value & ((1 << bit_nr) - 1)).bit_count()
+		return result
+
+	def select(self, k: int) -> int:
+		"""Return the index of the k-th set bit (k = 0 is the first one), that
+		is: the index i with bit_array[i] set and rank(i) == k. Raises
+		IndexError if not 0 <= k < count()."""
+
+		if not 0 <= k < self.count():
+			raise IndexError(f"select {k} out of range.")
+
+		block_nr = bisect_right(self.__cumulative, k) - 1
+		k -= self.__cumulative[block_nr]
+		block = self.__block_bytes(block_nr)
+		for word_start in range(0, len(block), self._WORD_BYTES):
+			word = int.from_bytes(block[word_start:
+			                            word_start + self._WORD_BYTES],
+			                      "little")
+			if k < (word_count := word.bit_count()):
+				for _ in range(k):
+					word &= word - 1   # clears the lowest set bit
+				return (block_nr * self.BLOCK_SIZE + 8 * word_start
+				        + (word & -word).bit_length() - 1)
+			k -= word_count
+
+		raise AssertionError("RankSelect directory is out of date.")
 
 #
 # if __name__ == "__main__":
@@ -1,22 +1,240 @@
 """A simple bloomfilter class implementation."""
+import struct
+import sys
 from array import array
-from math import log
-from hashlib import sha256
-from typing import Hashable
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from concurrent.futures import Future, ProcessPoolExecutor
+from copy import copy
+from itertools import chain, islice
+from math import ceil, e, inf, log, sqrt
+from hashlib import blake2b, sha256
+from multiprocessing import Manager
+from operator import add
+from os import PathLike, cpu_count
+from queue import Full, Queue
+from random import randrange
+from typing import BinaryIO, Hashable, NamedTuple, Optional, Self, TypeAlias
 
-from bitarray import BitArray
+from bitarray import BitArray, MmapBitArray, NibbleArray
+
+Item: TypeAlias = Hashable | bytearray | memoryview
+"""An item that can be stored in a filter: bytes-like items are hashed as
+is, str items UTF-8 encoded, other items by their type name and repr()."""
+
+
+def _encode(item: Item) -> bytes:
+	"""Return the canonical byte encoding of item that is hashed: bytes-like
+	items are used as is, strings are UTF-8 encoded, other items are
+	represented by their type name and repr(). The latter start with a 0xff
+	byte, which never occurs in UTF-8, so 1 and "1" are distinct items. A
+	str and the bytes of its UTF-8 encoding ("1" and b"1") are the same
+	item, by design."""
+	
+	if isinstance(item, bytes):
+		return item
+	if isinstance(item, (bytearray, memoryview)):
+		return bytes(item)
+	if isinstance(item, str):
+		return item.encode("utf-8")
+	return b"\xff" + f"{type(item).__qualname__}:{item!r}".encode("utf-8")
+
+
+class PreparedItem:
+	"""An item with its canonical encoding and the digests computed from it
+	so far, so an item that is added to, queried in or deleted from several
+	filters is encoded once, and hashed once per hash scheme. All filters
+	accept a PreparedItem wherever they accept an item (see prepare)."""
+	
+	__slots__ = ("item", "encoded", "__digests", "__sha256_hashes")
+	
+	def __init__(self, item: Item):
+		if isinstance(item, (bytearray, memoryview)):
+			# Freeze the contents (also gives the sha256 scheme a stable repr).
+			item = bytes(item)
+		self.item: Hashable = item
+		self.encoded = _encode(item)
+		self.__digests: dict[int, bytes] = {}
+		self.__sha256_hashes: list[int] = []
+	
+	def blake2b(self, digest_size: int) -> bytes:
+		"""Return the BLAKE2b digest of digest_size bytes of the encoding."""
+		
+		digest = self.__digests.get(digest_size)
+		if digest is None:
+			digest = blake2b(self.encoded, digest_size=digest_size).digest()
+			self.__digests[digest_size] = digest
+		return digest
+	
+	def sha256_hashes(self, nr_hash: int) -> list[int]:
+		"""Return the first nr_hash hashes of the sha256 scheme: hash i is the
+		SHA-256 hash of str((item, i))."""
+		
+		hashes = self.__sha256_hashes
+		for i in range(len(hashes), nr_hash):
+			hashes.append(int(sha256(str((self.item, i)).encode("utf-8"))
+			                  .hexdigest(), 16))
+		return hashes[:nr_hash]
+
+
+def prepare(item: "Item | PreparedItem") -> PreparedItem:
+	"""Return item as a PreparedItem (item itself if it is one already), to
+	reuse the hash work when the same item is used with several filters."""
+	
+	if isinstance(item, PreparedItem):
+		return item
+	return PreparedItem(item)
+
+
+IndexFunction: TypeAlias = Callable[[PreparedItem, int, int], list[int]]
+"""An index function returns the nr_hash bit indices in range(size) for a
+prepared item: index_function(prepared, nr_hash, size)."""
+
+
+def sha256_indices(prepared: PreparedItem, nr_hash: int, size: int) \
+	-> list[int]:
+	"""The original hash scheme: index i is the SHA-256 hash of str((item, i))
+	modulo size. Costs nr_hash cryptographic hashes per item, so it is only
+	kept for compatibility with existing filters."""
+	
+	return [h % size for h in prepared.sha256_hashes(nr_hash)]
+
+
+def double_hash_indices(prepared: PreparedItem, nr_hash: int, size: int) \
+	-> list[int]:
+	"""Kirsch-Mitzenmacher double hashing: a single 128-bit BLAKE2b digest of
+	the item is split into two 64-bit hashes h1 and h2, from which all
+	indices are derived. This has the same asymptotic false positive rate as
+	nr_hash independent hashes, at the cost of one hash. Plain double
+	hashing (index i = h1 + i * h2 modulo size) degenerates when h2 has a
+	small order modulo size (e.g. h2 = size / 2 gives only two distinct
+	indices), so the 'enhanced' variant of Dillinger and Manolios is used,
+	which adds i * (i - 1) * (i - 2) / 6 to index i (0 for the first three
+	indices, then 1, 4, 10, ...)."""
+	
+	digest = prepared.blake2b(16)
+	index = int.from_bytes(digest[:8], "little") % size
+	step = int.from_bytes(digest[8:], "little") % size
+	indices = []
+	for i in range(nr_hash):
+		indices.append(index)
+		index = (index + step) % size
+		step = (step + i) % size
+	return indices
+
+
+BLOCK_SIZE = 512   # bits in one 64-byte cache line
+_POSITION_BITS = 9   # bits needed for a position in a block
+
+
+def _block_positions(prepared: PreparedItem, nr_hash: int, size: int) \
+	-> tuple[int, list[int]]:
+	"""Return the block nr of item and the positions of its nr_hash bits in
+	that block, for a filter of size bits split in blocks of BLOCK_SIZE
+	bits. One BLAKE2b digest is used: its first 64 bits select the block, and
+	each following 9 bits give one position in the block. Double hashing is
+	not used for the positions: within a block this small, arithmetic
+	progressions of positions of different items overlap too often. Only if
+	the digest (at most 64 bytes) is exhausted, the remaining positions are
+	derived by double hashing."""
+	
+	nr_position_bytes = min((_POSITION_BITS * nr_hash + 7) // 8, 56)
+	digest = prepared.blake2b(8 + nr_position_bytes)
+	block_size = min(BLOCK_SIZE, size)
+	bits = int.from_bytes(digest[8:], "little")
+	positions = [(bits >> (_POSITION_BITS * i)) % block_size
+	             for i in range(min(nr_hash,
+	                                8 * nr_position_bytes // _POSITION_BITS))]
+	if len(positions) < nr_hash:
+		start, step = bits % block_size, (bits >> 64) | 1
+		positions.extend((start + i * step) % block_size
+		                 for i in range(len(positions), nr_hash))
+	return (int.from_bytes(digest[:8], "little") % (size // block_size),
+	        positions)
+
+
+def blocked_indices(prepared: PreparedItem, nr_hash: int, size: int) \
+	-> list[int]:
+	"""All nr_hash indices of item lie in the same block of BLOCK_SIZE bits
+	(one cache line), so a query needs only one memory access, at the cost
+	of a somewhat higher false positive rate."""
+	
+	block_nr, positions = _block_positions(prepared, nr_hash, size)
+	base = block_nr * min(BLOCK_SIZE, size)
+	return [base + position for position in positions]
+
+
+HASH_SCHEMES: dict[str, IndexFunction] = {"sha256": sha256_indices,
+                                          "blake2b": double_hash_indices,
+                                          "blocked": blocked_indices}
+"""The available hash schemes, by name. A filter only finds items that were
+added with the same hash scheme."""
+
+
+def _results(results: list[bool], as_numpy: bool) -> Sequence[bool]:
+	"""Return results, as a NumPy array of bools if as_numpy is True. NumPy is
+	an optional dependency, only imported when needed."""
+	
+	if not as_numpy:
+		return results
+	
+	import numpy   # type: ignore
+	return numpy.array(results, dtype=bool)   # type: ignore
+
+
+class BloomFilterStats(NamedTuple):
+	"""Runtime statistics of a bloom filter (see BloomFilter.stats)."""
+	
+	size: int
+	nr_hash: int
+	bits_set: int
+	fill_ratio: float
+	estimated_nr_items: float
+	estimated_false_positive_rate: float
+	nr_adds: int
+	nr_queries: int
+	nr_hashed: int
 
 
 class BloomFilter:
-	"""A simple bloom filter."""
+	"""A simple bloom filter. The hash_scheme is the name of one of the
+	HASH_SCHEMES (the default "blake2b" is much faster than the original
+	"sha256" scheme).
 	
-	hash_func = sha256
+	A filter can be saved to a file and loaded again. The file starts with a
+	header of HEADER_SIZE bytes (magic, format version, false positive rate,
+	nr of items, size in bits, nr of hashes, hash scheme and counter type),
+	followed by the bits of the filter. The counter type is empty for a
+	plain filter; a CountingBloomFilter stores its counters instead of bits
+	(see there)."""
 	
-	def __init__(self, false_positive_rate: float, nr_items: int):
+	FORMAT_VERSION = 1
+	HEADER_SIZE = 64
+	_MAGIC = b"BLMF"
+	_HEADER = struct.Struct("<4sHdQQI16s1s")
+	
+	def __init__(self, false_positive_rate: float, nr_items: int,
+	             hash_scheme: str = "blake2b"):
+		if hash_scheme not in HASH_SCHEMES:
+			raise ValueError(f"Unknown hash scheme {hash_scheme!r} (must be "
+			                 f"one of {', '.join(HASH_SCHEMES)}).")
 		self.__false_positive_rate = false_positive_rate
 		self.__nr_items = nr_items
+		self._hash_scheme = hash_scheme
+		self._indices_of = HASH_SCHEMES[hash_scheme]
 		self._size = self.__optimal_size()
 		self._nr_hash = self.__optimal_nr_of_hash()
+		self._reset_counters()
+		self._allocate()
+
+	def _reset_counters(self) -> None:
+		"""Reset the counters of the nr of items added, queried and hashed
+		(see stats)."""
+		
+		self._nr_adds = self._nr_queries = self._nr_hashed = 0
+
+	def _allocate(self) -> None:
+		"""Allocate the storage of the filter (once _size is known)."""
+		
 		self._bit_array = BitArray(self._size)
 
 	def __optimal_size(self) -> int:
@@ -31,84 +249,1142 @@ class BloomFilter:
 	def __str__(self) -> str:
 		return (f"fpr     = {self.__false_positive_rate},\n"
 		        f"nr_hash = {self.__optimal_nr_of_hash()},\n"
-		        f"bytes   = {(self.__optimal_size() + 7) // 8}")
+		        f"bytes   = {(self.__optimal_size() + 7) // 8},\n"
+		        f"hashing = {self._hash_scheme}")
 	
-	def _hash(self, item: str) -> int:
-		return (int(BloomFilter.hash_func(item.encode("utf-8")).hexdigest(), 16)
-		        % self._size)
+	def _indices(self, item: Item) -> list[int]:
+		"""Return the bit indices of item (an item or a PreparedItem)."""
+		
+		self._nr_hashed += 1
+		return self._indices_of(prepare(item), self._nr_hash, self._size)
 		
-	def add(self, item: Hashable) -> None:
+	def add(self, item: Item) -> None:
 		"""'Adds' an item to the filter."""
 		
-		for i in range(self._nr_hash):
-			self._bit_array[self._hash(str((item, i)))] = True
+		self._nr_adds += 1
+		for bit_offset in self._indices(item):
+			self._bit_array[bit_offset] = True
 	
-	def query(self, item: Hashable) -> bool:
+	def query(self, item: Item) -> bool:
 		"""Return True if item 'found', else False. Note that False means that
 		the item is 100% certain not in the filter, but True means there's a 1
 		in self.__false_positive_rate probability that the item is NOT in the
 		filter!"""
 		
-		for i in range(self._nr_hash):
-			if not self._bit_array[self._hash(str((item, i)))]:
+		self._nr_queries += 1
+		for bit_offset in self._indices(item):
+			if not self._bit_array[bit_offset]:
 				return False
 		return True
 
+	def add_many(self, items: Iterable[Item]) -> None:
+		"""'Adds' all items to the filter. Faster than calling add for each
+		item, since the bits of all items are set in one bulk operation."""
+		
+		self._bit_array.set_bits(chain.from_iterable(
+			map(self._indices, self.__counted_adds(items))))
+
+	def __counted_adds(self, items: Iterable[Item]) -> Iterator[Item]:
+		"""Yield the items, counting them as added while they stream by."""
+		
+		for item in items:
+			self._nr_adds += 1
+			yield item
+	
+	def query_many(self, items: Iterable[Item], as_numpy: bool = False) \
+		-> Sequence[bool]:
+		"""Return, for every item, whether it is 'found' (see query), as a
+		list of bools, or as a NumPy array of bools if as_numpy is True."""
+		
+		all_set = self._bit_array.all_set
+		results = [all_set(indices) for indices in map(self._indices, items)]
+		self._nr_queries += len(results)
+		return _results(results, as_numpy)
+
+	def _nr_bits_set(self) -> int:
+		"""Return the nr of bits set (bulk popcount)."""
+		
+		return self._bit_array.count()
+
+	def stats(self) -> BloomFilterStats:
+		"""Return runtime statistics of the filter: its size and nr of hashes,
+		the nr and fraction of bits set, estimates of the nr of (distinct)
+		items added and of the current false positive rate, and the nr of
+		items added, queried and hashed so far. With X bits set out of m,
+		and k hashes, the nr of items is estimated as -m / k * ln(1 - X / m)
+		(Swamidass & Baldi), and the false positive rate as (X / m) ^ k.
+		Cheap enough to call periodically: the bits are counted in bulk."""
+		
+		bits_set = self._nr_bits_set()
+		fill_ratio = bits_set / self._size
+		estimated_nr_items = (-self._size / self._nr_hash * log(1 - fill_ratio)
+		                      if fill_ratio < 1 else float("inf"))
+		return BloomFilterStats(self._size, self._nr_hash, bits_set,
+		                        fill_ratio, estimated_nr_items,
+		                        fill_ratio ** self._nr_hash, self._nr_adds,
+		                        self._nr_queries, self._nr_hashed)
+
+	def _check_compatible(self, other: "BloomFilter") -> None:
+		if (self._size, self._nr_hash, self._hash_scheme) \
+				!= (other._size, other._nr_hash, other._hash_scheme):
+			raise ValueError("Bloom filters differ in size, nr of hashes or "
+			                 "hash scheme.")
+
+	def _bits(self) -> BitArray:
+		"""Return the bits of the filter (set where an item may be)."""
+		
+		return self._bit_array
+
+	def _with_bit_array(self, bit_array: BitArray) -> "BloomFilter":
+		"""Return a (plain) BloomFilter with the same parameters as self and
+		bit_array as its bits."""
+		
+		result = BloomFilter.__new__(BloomFilter)
+		result.__false_positive_rate = self.__false_positive_rate
+		result.__nr_items = self.__nr_items
+		result._hash_scheme = self._hash_scheme
+		result._indices_of = self._indices_of
+		result._size = self._size
+		result._nr_hash = self._nr_hash
+		result._bit_array = bit_array
+		result._reset_counters()
+		return result
+
+	def union(self, other: "BloomFilter") -> "BloomFilter":
+		"""Return a new filter that 'contains' all items in self and in other
+		(exactly as if they had all been added to one filter). Both filters
+		must have the same size, nr of hashes and hash scheme, e.g. because
+		they were created with the same arguments."""
+		
+		self._check_compatible(other)
+		return self._with_bit_array(self._bits() | other._bits())
+
+	def intersection(self, other: "BloomFilter") -> "BloomFilter":
+		"""Return a new filter that 'contains' the items in both self and
+		other. Its false positive rate is at most that of the filters, but
+		may be higher than that of a filter built from only the common
+		items."""
+		
+		self._check_compatible(other)
+		return self._with_bit_array(self._bits() & other._bits())
+
+	def save(self, filename: str | PathLike[str]) -> None:
+		"""Save the filter to filename (see class docstring for the format)."""
+		
+		header = self._HEADER.pack(self._MAGIC, self.FORMAT_VERSION,
+		                           self.__false_positive_rate, self.__nr_items,
+		                           self._size, self._nr_hash,
+		                           self._hash_scheme.encode("ascii"),
+		                           self._counter_type().encode("ascii"))
+		with open(filename, "wb") as file:
+			file.write(header.ljust(self.HEADER_SIZE, b"\x00"))
+			file.write(self._storage())
+
+	def _counter_type(self) -> str:
+		"""Return the counter type saved in the header ("" for bits)."""
+		
+		return ""
+
+	def _storage(self) -> memoryview:
+		"""Return the bits (or counters) of the filter, as saved."""
+		
+		return self._bit_array.view()
+
+	def _load_storage(self, filename: str | PathLike[str], file: BinaryIO,
+	                  counter_type: str, mmap: bool, writable: bool) -> None:
+		"""Load the bits (or counters) saved in filename, from file (which is
+		positioned just after the header), or memory-map them."""
+		
+		if counter_type:
+			raise ValueError(f"{filename} is a saved CountingBloomFilter.")
+		if mmap:
+			self._bit_array = MmapBitArray(filename, self._size,
+			                               "r+" if writable else "r",
+			                               offset=self.HEADER_SIZE)
+		else:
+			self._bit_array = BitArray.from_bytes(
+				file.read((self._size + 7) // 8), self._size)
+
+	@classmethod
+	def load(cls, filename: str | PathLike[str], mmap: bool = True,
+	         writable: bool = False) -> Self:
+		"""Return the filter saved in filename. If mmap is True, the bits are
+		not read, but memory-mapped from the file, so the filter can be
+		queried immediately, and processes loading the same file share its
+		bits. Items added to a filter that is mapped writable are written to
+		the file; call close() when done. A filter that is mapped read-only
+		(the default) cannot be added to."""
+		
+		with open(filename, "rb") as file:
+			header = file.read(cls.HEADER_SIZE)
+			if (len(header) != cls.HEADER_SIZE
+			        or not header.startswith(cls._MAGIC)):
+				raise ValueError(f"{filename} is not a saved BloomFilter.")
+			(_, version, false_positive_rate, nr_items, size, nr_hash,
+			 hash_scheme, counter_type) = cls._HEADER.unpack_from(header)
+			if version != cls.FORMAT_VERSION:
+				raise ValueError(f"{filename} has unsupported format version "
+				                 f"{version}.")
+			hash_scheme = hash_scheme.rstrip(b"\x00").decode("ascii")
+			if hash_scheme not in HASH_SCHEMES:
+				raise ValueError(f"{filename} has unknown hash scheme "
+				                 f"{hash_scheme!r}.")
+			
+			bloom_filter = cls.__new__(cls)
+			bloom_filter.__false_positive_rate = false_positive_rate
+			bloom_filter.__nr_items = nr_items
+			bloom_filter._hash_scheme = hash_scheme
+			bloom_filter._indices_of = HASH_SCHEMES[hash_scheme]
+			bloom_filter._size = size
+			bloom_filter._nr_hash = nr_hash
+			bloom_filter._reset_counters()
+			bloom_filter._load_storage(
+				filename, file, counter_type.rstrip(b"\x00").decode("ascii"),
+				mmap, writable)
+		return bloom_filter
+
+	def close(self) -> None:
+		"""Release the file mapping of a filter loaded with mmap=True (writing
+		back any changes). The filter can no longer be used afterwards. Has
+		no effect on other filters."""
+		
+		if isinstance(self._bit_array, MmapBitArray):
+			self._bit_array.close()
+
+
+class BlockedBloomFilter(BloomFilter):
+	"""A cache-line blocked bloom filter: one hash selects a block of
+	BLOCK_SIZE bits (64 bytes, one cache line), and all bits of an item are
+	in that block. A query reads that one block instead of nr_hash random
+	places in the filter, at the cost of a somewhat higher false positive
+	rate (the load of the blocks varies). Uses the "blocked" hash scheme, so
+	a saved BlockedBloomFilter can also be loaded as a plain BloomFilter."""
+	
+	def __init__(self, false_positive_rate: float, nr_items: int):
+		super().__init__(false_positive_rate, nr_items, "blocked")
+
+	def _allocate(self) -> None:
+		"""Round the size up to a whole nr of blocks, then allocate the
+		bits."""
+		
+		self._size = -(-self._size // BLOCK_SIZE) * BLOCK_SIZE
+		super()._allocate()
+	
+	def query(self, item: Item) -> bool:
+		"""Return True if item 'found', else False (see BloomFilter.query).
+		Tests all bits of item at once against its block."""
+		
+		self._nr_queries += 1
+		self._nr_hashed += 1
+		block_nr, positions = _block_positions(prepare(item), self._nr_hash,
+		                                       self._size)
+		mask = 0
+		for position in positions:
+			mask |= 1 << position
+		start = block_nr * (BLOCK_SIZE // 8)
+		block = self._bit_array.view()[start:start + BLOCK_SIZE // 8]
+		return int.from_bytes(block, "little") & mask == mask
+	
+	def query_many(self, items: Iterable[Item], as_numpy: bool = False) \
+		-> Sequence[bool]:
+		"""Return, for every item, whether it is 'found' (see query), as a
+		list of bools, or as a NumPy array of bools if as_numpy is True."""
+		
+		return _results([self.query(item) for item in items], as_numpy)
+
+
+def _batches(items: Iterable[Item], batch_size: int) \
+	-> Iterator[list[Item]]:
+	"""Yield consecutive lists of (at most) batch_size items."""
+	
+	iterator = iter(items)
+	while batch := list(islice(iterator, batch_size)):
+		yield batch
+
+
+def _build_shard(batches: "Queue[Optional[list[Item]]]",
+                 false_positive_rate: float, nr_items: int,
+                 hash_scheme: str) -> bytes:
+	"""Worker process of build_parallel: add all batches from the queue (up to
+	the first None) to a filter, and return its bits."""
+	
+	bloom_filter = BloomFilter(false_positive_rate, nr_items, hash_scheme)
+	while (batch := batches.get()) is not None:
+		bloom_filter.add_many(batch)
+	return bloom_filter._bit_array.to_bytes()
+
+
+def build_parallel(items: Iterable[Item], false_positive_rate: float,
+                   nr_items: int, hash_scheme: str = "blake2b",
+                   processes: Optional[int] = None,
+                   batch_size: int = 100_000) -> BloomFilter:
+	"""Return a BloomFilter(false_positive_rate, nr_items, hash_scheme) with
+	all items added, built by a pool of processes (by default one per CPU).
+	The items are sent to the workers in batches of batch_size. Each worker
+	fills its own filter of the same shape, and the bits of the workers'
+	filters are OR-ed together at the end (exactly the bits a single filter
+	would have). The items must be picklable."""
+	
+	processes = processes or cpu_count() or 1
+	result = BloomFilter(false_positive_rate, nr_items, hash_scheme)
+	
+	with Manager() as manager, ProcessPoolExecutor(processes) as executor:
+		batches: "Queue[Optional[list[Item]]]" \
+			= manager.Queue(maxsize=2 * processes)
+		shards: list[Future[bytes]] \
+			= [executor.submit(_build_shard, batches, false_positive_rate,
+			                   nr_items, hash_scheme)
+			   for _ in range(processes)]
+		
+		def put(batch: Optional[list[Item]]) -> None:
+			# Do not block forever on a full queue if the workers failed.
+			while True:
+				try:
+					batches.put(batch, timeout=1)
+					return
+				except Full:
+					for shard in shards:
+						if shard.done():
+							shard.result()   # raises the worker's exception
+		
+		for batch in _batches(items, batch_size):
+			put(batch)
+		for _ in range(processes):
+			put(None)
+		
+		for shard in shards:
+			result._bit_array |= BitArray.frombuffer(shard.result(),
+			                                         result._size)
+	return result
+
 
 class CountingBloomFilter(BloomFilter):
-	"""A simple counting bloom filter (which allows for deleting items)."""
+	"""A simple counting bloom filter (which allows for deleting items). The
+	filter has a counter per bit offset instead of a bit. By default
+	(counter_type NIBBLE_COUNTERS), the counters are packed 4-bit counters,
+	two per byte. Otherwise, counter_type is the typecode of an array of
+	counters, e.g. 'B' for 8-bit counters.
+	
+	Counters saturate: once a counter reaches its maximum value (15 for
+	4-bit counters) it is 'sticky', that is, it is never incremented or
+	decremented anymore (its true count is unknown, so decrementing it could
+	cause false negatives). With 4-bit counters this happens very rarely for
+	a filter that is not overfull.
+	
+	A saved filter stores its counters (little-endian) instead of bits, and
+	its counter type in the header. The counters are always read on load,
+	never memory-mapped."""
+
+	NIBBLE_COUNTERS = "4"
 
 	def __init__(self, false_positive_rate: float, nr_items: int,
-	             counter_type: str):
-		super().__init__(false_positive_rate, nr_items)
-		self.__counters = array(counter_type, (0 for _ in range(self._size)))
-	
+	             counter_type: str = NIBBLE_COUNTERS,
+	             hash_scheme: str = "blake2b"):
+		self.__counter_type = counter_type
+		super().__init__(false_positive_rate, nr_items, hash_scheme)
+
+	def _allocate(self) -> None:
+		"""Allocate the counters (and no separate bit array)."""
+		
+		self.__counters: "NibbleArray | array[int]"
+		if self.__counter_type == self.NIBBLE_COUNTERS:
+			self.__counters = NibbleArray(self._size)
+			self.__max_counter = NibbleArray.MAX_VALUE
+		else:
+			counters = array(self.__counter_type)
+			counters.frombytes(bytes(self._size * counters.itemsize))
+			self.__counters = counters
+			nr_bits = 8 * counters.itemsize
+			if self.__counter_type.islower():   # signed
+				nr_bits -= 1
+			self.__max_counter = (1 << nr_bits) - 1
+
 	def decrement_counter(self, bit_offset: int) -> int:
-		"""Decrement the counter at bit_offset, return new counter value."""
+		"""Decrement the counter at bit_offset (unless saturated), return new
+		counter value."""
 		
-		new_counter = self.__counters[bit_offset] - 1
-		self.__counters[bit_offset] = new_counter
+		new_counter = self.__counters[bit_offset]
+		if new_counter != self.__max_counter:
+			new_counter -= 1
+			self.__counters[bit_offset] = new_counter
 		return new_counter
 	
 	def increment_counter(self, bit_offset: int) -> int:
-		"""Increment the counter at bit_offset, return new counter value."""
+		"""Increment the counter at bit_offset (unless saturated), return new
+		counter value."""
 
-		new_counter = self.__counters[bit_offset] + 1
-		self.__counters[bit_offset] = new_counter
+		new_counter = self.__counters[bit_offset]
+		if new_counter != self.__max_counter:
+			new_counter += 1
+			self.__counters[bit_offset] = new_counter
 		return new_counter
 	
-	def add(self, item: Hashable) -> None:
+	def add(self, item: Item) -> None:
 		"""'Adds' an item to the filter."""
 		
-		for i in range(self._nr_hash):
-			bit_offset = self._hash(str((item, i)))
-			if self.increment_counter(bit_offset) == 1:
-				self._bit_array[bit_offset] = True
+		self._nr_adds += 1
+		for bit_offset in self._indices(item):
+			self.increment_counter(bit_offset)
 
-	def query(self, item: Hashable) -> bool:
+	def query(self, item: Item) -> bool:
 		"""Return True if item 'found', else False. Note that False means that
 		the item is 100% certain not in the filter, but True means there's a 1
 		in self.__false_positive_rate probability that the item is NOT in the
 		filter!"""
 
-		for i in range(self._nr_hash):
-			if not self.__counters[self._hash(str((item, i)))]:
+		self._nr_queries += 1
+		for bit_offset in self._indices(item):
+			if not self.__counters[bit_offset]:
 				return False
 		return True
 
-	def delete(self, item: Hashable) -> bool:
+	def add_many(self, items: Iterable[Item]) -> None:
+		"""'Adds' all items to the filter."""
+		
+		counters, max_counter = self.__counters, self.__max_counter
+		for indices in map(self._indices, items):
+			self._nr_adds += 1
+			for bit_offset in indices:
+				if (counter := counters[bit_offset]) != max_counter:
+					counters[bit_offset] = counter + 1
+
+	def query_many(self, items: Iterable[Item], as_numpy: bool = False) \
+		-> Sequence[bool]:
+		"""Return, for every item, whether it is 'found' (see query), as a
+		list of bools, or as a NumPy array of bools if as_numpy is True."""
+		
+		counters = self.__counters
+		results = [all(counters[bit_offset] for bit_offset in indices)
+		           for indices in map(self._indices, items)]
+		self._nr_queries += len(results)
+		return _results(results, as_numpy)
+
+	def _nr_bits_set(self) -> int:
+		"""Return the nr of non-zero counters."""
+		
+		if isinstance(self.__counters, NibbleArray):
+			return self.__counters.count_nonzero()
+		return len(self.__counters) - self.__counters.count(0)
+
+	def _bits(self) -> BitArray:
+		"""Return a bit per counter, set where the counter is not 0."""
+		
+		counters = self.__counters
+		bits = BitArray(self._size)
+		bits.set_bits(bit_offset for bit_offset in range(self._size)
+		              if counters[bit_offset])
+		return bits
+
+	def __combine(self, other: "CountingBloomFilter",
+	              combine: Callable[[float, float], float]) \
+		-> "CountingBloomFilter":
+		"""Return a new filter like self, with counters combine(c, d) of the
+		counters c of self and d of other. A saturated counter stands for an
+		unknown count, so it is passed as infinity: it saturates the sum, but
+		the minimum with a count d is d."""
+		
+		self._check_compatible(other)
+		result = copy(self)
+		result._reset_counters()
+		result._allocate()
+		counters, max_counter = result.__counters, self.__max_counter
+		other_max = other.__max_counter
+		for bit_offset in range(self._size):
+			count = self.__counters[bit_offset]
+			other_count = other.__counters[bit_offset]
+			combined = combine(
+				inf if count == max_counter else count,
+				inf if other_count == other_max else other_count)
+			counters[bit_offset] = int(min(combined, max_counter))
+		return result
+
+	def union(self, other: BloomFilter) -> BloomFilter:
+		"""Return a new filter that contains all items in self and in other.
+		If other is a CountingBloomFilter, the result is a CountingBloomFilter
+		(with the counter type of self) whose counters are the sums of the
+		counters, so items can still be deleted. Otherwise, the result is a
+		plain BloomFilter (see BloomFilter.union)."""
+		
+		if isinstance(other, CountingBloomFilter):
+			return self.__combine(other, add)
+		return super().union(other)
+
+	def intersection(self, other: BloomFilter) -> BloomFilter:
+		"""Return a new filter that contains the items in both self and
+		other. If other is a CountingBloomFilter, the result is a
+		CountingBloomFilter whose counters are the minimums of the counters.
+		Otherwise, the result is a plain BloomFilter (see
+		BloomFilter.intersection)."""
+		
+		if isinstance(other, CountingBloomFilter):
+			return self.__combine(other, min)
+		return super().intersection(other)
+
+	def _counter_type(self) -> str:
+		return self.__counter_type
+
+	def _storage(self) -> memoryview:
+		if isinstance(self.__counters, NibbleArray):
+			return self.__counters.view()
+		if sys.byteorder == "little":
+			return memoryview(self.__counters)
+		counters = array(self.__counter_type, self.__counters)
+		counters.byteswap()
+		return memoryview(counters)
+
+	def _load_storage(self, filename: str | PathLike[str], file: BinaryIO,
+	                  counter_type: str, mmap: bool, writable: bool) -> None:
+		"""Read the counters: they are never memory-mapped, so mmap and
+		writable are ignored."""
+		
+		if not counter_type:
+			raise ValueError(f"{filename} is not a saved "
+			                 f"CountingBloomFilter.")
+		self.__counter_type = counter_type
+		self._allocate()
+		if isinstance(self.__counters, NibbleArray):
+			self.__counters = NibbleArray.from_bytes(
+				file.read(self.__counters.nbytes), self._size)
+			return
+		data = file.read(self._size * self.__counters.itemsize)
+		if len(data) != len(self.__counters) * self.__counters.itemsize:
+			raise ValueError(f"{filename} is truncated.")
+		self.__counters = array(counter_type, data)
+		if sys.byteorder == "big":
+			self.__counters.byteswap()
+
+	def close(self) -> None:
+		"""Nothing to close: a CountingBloomFilter is never memory-mapped."""
+
+	def delete(self, item: Item) -> bool:
 		"""Return True if item is in the filter and was deleted, or False if
 		item not in the filter (and therefore not deleted)."""
 		
-		if self.query(item):
-			for i in range(self._nr_hash):
-				bit_offset = self._hash(str((item, i)))
-				if self.decrement_counter(bit_offset) == 0:
-					self._bit_array[bit_offset] = False
+		self._nr_queries += 1
+		indices = self._indices(item)
+		if all(self.__counters[bit_offset] for bit_offset in indices):
+			for bit_offset in indices:
+				self.decrement_counter(bit_offset)
 			return True
 		
 		return False
 
+	def delete_many(self, items: Iterable[Item]) -> list[bool]:
+		"""Delete all items, return for every item whether it was in the
+		filter (and was deleted, see delete)."""
+		
+		counters, max_counter = self.__counters, self.__max_counter
+		deleted = []
+		for indices in map(self._indices, items):
+			if found := all(counters[bit_offset] for bit_offset in indices):
+				for bit_offset in indices:
+					if (counter := counters[bit_offset]) != max_counter:
+						counters[bit_offset] = counter - 1
+			deleted.append(found)
+		return deleted
+
+
+class CuckooFilter:
+	"""A cuckoo filter: like a CountingBloomFilter it supports add, query and
+	delete, but it stores a fingerprint of fingerprint_bits bits per item in
+	one of two candidate buckets of bucket_size slots, which takes less
+	space at low false positive rates (about 2 * bucket_size /
+	2 ** fingerprint_bits), and a query probes only two buckets.
+	
+	An item is stored in its first bucket if there is room, else in its
+	alternate bucket (the first bucket XOR a hash of the fingerprint, so the
+	alternate bucket of a stored fingerprint can be computed without the
+	item). If both are full, a random fingerprint in the alternate bucket is
+	kicked out and moved to its alternate bucket, and so on, up to max_kicks
+	times. The fingerprint still homeless after that is kept aside (so no
+	item is ever lost), and the filter is full: adding another item raises
+	OverflowError. The number of buckets is chosen (a power of 2) such that
+	nr_items fit with a load of at most load_factor. As with a
+	CountingBloomFilter, only delete items that were added: deleting a false
+	positive deletes another item's fingerprint."""
+
+	def __init__(self, nr_items: int, fingerprint_bits: int = 12,
+	             bucket_size: int = 4, max_kicks: int = 500,
+	             load_factor: float = 0.95):
+		if not 1 <= fingerprint_bits <= 32:
+			raise ValueError(f"fingerprint_bits must be in range(1, 33), not "
+			                 f"{fingerprint_bits}.")
+		self.__fingerprint_bits = fingerprint_bits
+		self.__bucket_size = bucket_size
+		self.__max_kicks = max_kicks
+		min_nr_buckets = max(int(nr_items / (bucket_size * load_factor)) + 1,
+		                     2)
+		self.__nr_buckets = 1 << (min_nr_buckets - 1).bit_length()
+		self.__slots = array(next(typecode for typecode in "BHIL"
+		                          if 8 * array(typecode).itemsize
+		                          >= fingerprint_bits))
+		self.__slots.frombytes(bytes(self.__nr_buckets * bucket_size
+		                             * self.__slots.itemsize))
+		self.__nr_items = 0
+		self.__victim: Optional[tuple[int, int]] = None   # bucket, fingerprint
+
+	def __str__(self) -> str:
+		return (f"fpr     = {self.false_positive_rate},\n"
+		        f"buckets = {self.__nr_buckets} x {self.__bucket_size},\n"
+		        f"bytes   = {len(self.__slots) * self.__slots.itemsize}")
+
+	def __len__(self) -> int:
+		"""Return the nr of items in the filter."""
+		
+		return self.__nr_items
+
+	@property
+	def false_positive_rate(self) -> float:
+		"""Return the (upper bound of the) false positive rate of a full
+		filter."""
+		
+		return 2 * self.__bucket_size / (1 << self.__fingerprint_bits)
+
+	def __fingerprint_and_bucket(self, item: Item) -> tuple[int, int]:
+		"""Return the (non-zero, as 0 marks an empty slot) fingerprint and the
+		first bucket of item."""
+		
+		digest = prepare(item).blake2b(16)
+		fingerprint = (int.from_bytes(digest[8:], "little")
+		               % ((1 << self.__fingerprint_bits) - 1)) + 1
+		bucket = int.from_bytes(digest[:8], "little") & (self.__nr_buckets - 1)
+		return fingerprint, bucket
+
+	def __alternate_bucket(self, bucket: int, fingerprint: int) -> int:
+		# Multiplicative hash of the fingerprint (MurmurHash2 constant).
+		return ((bucket ^ (fingerprint * 0x5bd1e995))
+		        & (self.__nr_buckets - 1))
+
+	def __insert_in_bucket(self, bucket: int, fingerprint: int) -> bool:
+		"""Store fingerprint in bucket if it has an empty slot. Return True if
+		stored, else False."""
+		
+		start = bucket * self.__bucket_size
+		try:
+			slot = self.__slots.index(0, start, start + self.__bucket_size)
+		except ValueError:
+			return False
+		self.__slots[slot] = fingerprint
+		return True
+
+	def __in_bucket(self, bucket: int, fingerprint: int) -> bool:
+		start = bucket * self.__bucket_size
+		return fingerprint in self.__slots[start:start + self.__bucket_size]
+
+	def __delete_from_bucket(self, bucket: int, fingerprint: int) -> bool:
+		"""Remove (one copy of) fingerprint from bucket. Return True if
+		removed, else False."""
+		
+		start = bucket * self.__bucket_size
+		try:
+			slot = self.__slots.index(fingerprint, start,
+			                          start + self.__bucket_size)
+		except ValueError:
+			return False
+		self.__slots[slot] = 0
+		return True
+
+	def __insert(self, bucket: int, fingerprint: int) -> None:
+		"""Insert fingerprint in bucket or its alternate bucket, kicking out
+		other fingerprints if needed. If that fails, keep the last homeless
+		fingerprint as the victim."""
+		
+		alternate = self.__alternate_bucket(bucket, fingerprint)
+		if (self.__insert_in_bucket(bucket, fingerprint)
+		        or self.__insert_in_bucket(alternate, fingerprint)):
+			return
+		
+		bucket = alternate
+		for _ in range(self.__max_kicks):
+			slot = bucket * self.__bucket_size + randrange(self.__bucket_size)
+			fingerprint, self.__slots[slot] = self.__slots[slot], fingerprint
+			bucket = self.__alternate_bucket(bucket, fingerprint)
+			if self.__insert_in_bucket(bucket, fingerprint):
+				return
+		self.__victim = bucket, fingerprint
+
+	def add(self, item: Item) -> None:
+		"""'Adds' an item to the filter. Raises OverflowError if the filter is
+		full."""
+		
+		if self.__victim is not None:
+			raise OverflowError("CuckooFilter is full.")
+		fingerprint, bucket = self.__fingerprint_and_bucket(item)
+		self.__insert(bucket, fingerprint)
+		self.__nr_items += 1
+
+	def query(self, item: Item) -> bool:
+		"""Return True if item 'found', else False. As for a bloom filter,
+		False is certain, but True may be a false positive."""
+		
+		fingerprint, bucket = self.__fingerprint_and_bucket(item)
+		alternate = self.__alternate_bucket(bucket, fingerprint)
+		return (self.__in_bucket(bucket, fingerprint)
+		        or self.__in_bucket(alternate, fingerprint)
+		        or self.__victim in ((bucket, fingerprint),
+		                             (alternate, fingerprint)))
+
+	def delete(self, item: Item) -> bool:
+		"""Return True if item is in the filter and was deleted, or False if
+		item not in the filter (and therefore not deleted)."""
+		
+		fingerprint, bucket = self.__fingerprint_and_bucket(item)
+		alternate = self.__alternate_bucket(bucket, fingerprint)
+		if self.__victim in ((bucket, fingerprint), (alternate, fingerprint)):
+			self.__victim = None
+		elif not (self.__delete_from_bucket(bucket, fingerprint)
+		          or self.__delete_from_bucket(alternate, fingerprint)):
+			return False
+		
+		self.__nr_items -= 1
+		if self.__victim is not None:
+			# There is room now: try to find the victim a home.
+			victim_bucket, victim_fingerprint = self.__victim
+			self.__victim = None
+			self.__insert(victim_bucket, victim_fingerprint)
+		return True
+
+	def add_many(self, items: Iterable[Item]) -> None:
+		"""'Adds' all items to the filter (see add)."""
+		
+		for item in items:
+			self.add(item)
+
+	def query_many(self, items: Iterable[Item], as_numpy: bool = False) \
+		-> Sequence[bool]:
+		"""Return, for every item, whether it is 'found' (see query), as a
+		list of bools, or as a NumPy array of bools if as_numpy is True."""
+		
+		return _results([self.query(item) for item in items], as_numpy)
+
+	def delete_many(self, items: Iterable[Item]) -> list[bool]:
+		"""Delete all items, return for every item whether it was in the
+		filter (and was deleted, see delete)."""
+		
+		return [self.delete(item) for item in items]
+
+
+class ScalableBloomFilter:
+	"""A bloom filter that grows when more items are added than expected. It
+	is a chain of BloomFilters: when the fraction of set bits in the newest
+	filter reaches fill_ratio (0.5 for a filter filled to its design
+	capacity), a new filter is added with growth_factor times the capacity
+	and tightening_ratio times the false positive rate of the previous one.
+	The false positive rates of the filters form a geometric series with sum
+	false_positive_rate, so the overall false positive rate stays within
+	false_positive_rate, however many items are added."""
+	
+	def __init__(self, false_positive_rate: float, initial_nr_items: int,
+	             growth_factor: int = 2, tightening_ratio: float = 0.9,
+	             fill_ratio: float = 0.5, hash_scheme: str = "blake2b"):
+		if not 0 < tightening_ratio < 1:
+			raise ValueError(f"tightening_ratio must be in (0, 1), not "
+			                 f"{tightening_ratio}.")
+		self.__false_positive_rate = false_positive_rate
+		self.__growth_factor = growth_factor
+		self.__tightening_ratio = tightening_ratio
+		self.__fill_ratio = fill_ratio
+		self.__hash_scheme = hash_scheme
+		self.__filters: list[BloomFilter] = []
+		self.__add_filter(initial_nr_items,
+		                  false_positive_rate * (1 - tightening_ratio))
+	
+	def __add_filter(self, nr_items: int, false_positive_rate: float) -> None:
+		self.__filters.append(BloomFilter(false_positive_rate, nr_items,
+		                                  self.__hash_scheme))
+		self.__capacity = nr_items
+		self.__filter_fpr = false_positive_rate
+		self.__nr_bits_set = 0
+	
+	def __str__(self) -> str:
+		nr_bytes = sum((bf._size + 7) // 8 for bf in self.__filters)
+		return (f"fpr       = {self.__false_positive_rate},\n"
+		        f"nr_filter = {len(self.__filters)},\n"
+		        f"bytes     = {nr_bytes}")
+	
+	@property
+	def nr_filters(self) -> int:
+		"""Return the nr of bloom filters in the chain."""
+		
+		return len(self.__filters)
+	
+	def add(self, item: Item) -> None:
+		"""'Adds' an item to the newest filter (unless it is 'found' already,
+		so duplicates do not fill up the filter), and adds a new filter if the
+		newest one is full."""
+		
+		item = prepare(item)
+		if self.query(item):
+			return
+		
+		bloom_filter = self.__filters[-1]
+		bit_array = bloom_filter._bit_array
+		indices = bloom_filter._indices(item)
+		self.__nr_bits_set += sum(not bit_array[bit_offset]
+		                          for bit_offset in set(indices))
+		bit_array.set_bits(indices)
+		
+		if self.__nr_bits_set >= self.__fill_ratio * bloom_filter._size:
+			self.__add_filter(self.__capacity * self.__growth_factor,
+			                  self.__filter_fpr * self.__tightening_ratio)
+	
+	def add_many(self, items: Iterable[Item]) -> None:
+		"""'Adds' all items to the filter."""
+		
+		for item in items:
+			self.add(item)
+	
+	def query(self, item: Item) -> bool:
+		"""Return True if item 'found' in any of the filters, else False."""
+		
+		item = prepare(item)
+		# The newest filter is the largest, so most likely to contain item.
+		return any(bloom_filter.query(item)
+		           for bloom_filter in reversed(self.__filters))
+	
+	def query_many(self, items: Iterable[Item], as_numpy: bool = False) \
+		-> Sequence[bool]:
+		"""Return, for every item, whether it is 'found' (see query), as a
+		list of bools, or as a NumPy array of bools if as_numpy is True."""
+		
+		return _results([self.query(item) for item in items], as_numpy)
+
+
+class CountMinSketch:
+	"""A Count-Min sketch: estimates how often each item was added, in a
+	fixed amount of memory. It has depth rows of width counters; an item
+	increments one counter in every row, and its estimated count is the
+	minimum of its counters. Estimates are never too low, and with
+	width = ceil(e / epsilon) and depth = ceil(ln(1 / delta)) they are too
+	high by more than epsilon * total (the sum of all counts) with
+	probability at most delta. With conservative update, only the counters
+	that are below the new estimated count of the item are raised, which
+	reduces the overestimation (but sketches updated this way can no longer
+	be subtracted from each other)."""
+	
+	def __init__(self, epsilon: float, delta: float,
+	             conservative: bool = False):
+		if not epsilon > 0:
+			raise ValueError(f"epsilon must be > 0, not {epsilon}.")
+		if not 0 < delta < 1:
+			raise ValueError(f"delta must be in (0, 1), not {delta}.")
+		self.__epsilon = epsilon
+		self.__delta = delta
+		self.__conservative = conservative
+		self.__width = ceil(e / epsilon)
+		self.__depth = ceil(log(1 / delta))
+		self.__counters = array("Q", bytes(8 * self.__width * self.__depth))
+		self.__total = 0
+	
+	def __str__(self) -> str:
+		return (f"epsilon = {self.__epsilon},\n"
+		        f"delta   = {self.__delta},\n"
+		        f"width   = {self.__width},\n"
+		        f"depth   = {self.__depth},\n"
+		        f"bytes   = {self.__counters.itemsize * len(self.__counters)}")
+	
+	@property
+	def width(self) -> int:
+		"""Return the nr of counters per row."""
+		
+		return self.__width
+	
+	@property
+	def depth(self) -> int:
+		"""Return the nr of rows."""
+		
+		return self.__depth
+	
+	@property
+	def total(self) -> int:
+		"""Return the sum of all counts added."""
+		
+		return self.__total
+	
+	@property
+	def conservative(self) -> bool:
+		"""Return True if the sketch uses conservative update."""
+		
+		return self.__conservative
+	
+	def _indices(self, item: Item) -> list[int]:
+		"""Return the counter index of item in every row (item may be a
+		PreparedItem)."""
+		
+		width = self.__width
+		return [row * width + column
+		        for row, column in enumerate(double_hash_indices(
+		            prepare(item), self.__depth, width))]
+	
+	def __add(self, indices: list[int], count: int) -> None:
+		counters = self.__counters
+		if self.__conservative:
+			new_count = min(counters[i] for i in indices) + count
+			for i in indices:
+				if counters[i] < new_count:
+					counters[i] = new_count
+		else:
+			for i in indices:
+				counters[i] += count
+		self.__total += count
+	
+	def add(self, item: Item, count: int = 1) -> None:
+		"""Add count (default 1) occurrences of item."""
+		
+		if count < 0:
+			raise ValueError(f"count must be >= 0, not {count}.")
+		self.__add(self._indices(item), count)
+	
+	def add_many(self, items: Iterable[Item]) -> None:
+		"""Add one occurrence of every item."""
+		
+		for indices in map(self._indices, items):
+			self.__add(indices, 1)
+	
+	def add_counts(self, counts: Iterable[tuple[Item, int]]) -> None:
+		"""Add count occurrences of item for every (item, count) pair, e.g. for
+		the items of a dict or Counter of a batch."""
+		
+		for item, count in counts:
+			self.add(item, count)
+	
+	def estimate(self, item: Item) -> int:
+		"""Return the estimated count of item: never lower than its true
+		count, and at most epsilon * total higher with probability
+		1 - delta."""
+		
+		counters = self.__counters
+		return min(counters[i] for i in self._indices(item))
+	
+	def estimate_many(self, items: Iterable[Item]) -> list[int]:
+		"""Return the estimated count of every item (see estimate)."""
+		
+		counters = self.__counters
+		return [min(counters[i] for i in indices)
+		        for indices in map(self._indices, items)]
+	
+	def __check_compatible(self, other: "CountMinSketch") -> None:
+		if (self.__width, self.__depth) != (other.__width, other.__depth):
+			raise ValueError(f"CountMinSketches of different shapes "
+			                 f"({self.__depth} x {self.__width} and "
+			                 f"{other.__depth} x {other.__width}) cannot be "
+			                 f"merged.")
+	
+	def merge(self, other: "CountMinSketch") -> "CountMinSketch":
+		"""Return the sketch of the items added to self and other, which must
+		have the same epsilon and delta. The result uses conservative update
+		if either sketch does."""
+		
+		self.__check_compatible(other)
+		merged = CountMinSketch(self.__epsilon, self.__delta,
+		                        self.__conservative or other.__conservative)
+		merged.__counters = array("Q", map(int.__add__, self.__counters,
+		                                   other.__counters))
+		merged.__total = self.__total + other.__total
+		return merged
+	
+	def update(self, other: "CountMinSketch") -> None:
+		"""Add the counts of other (with the same epsilon and delta) to self,
+		as merge, but in place."""
+		
+		self.__check_compatible(other)
+		counters = self.__counters
+		for i, count in enumerate(other.__counters):
+			if count:
+				counters[i] += count
+		self.__total += other.__total
+
+
+class HyperLogLog:
+	"""A HyperLogLog estimator of the nr of distinct items added, using
+	2 ** precision one-byte registers: the hash of an item selects a
+	register, which keeps the maximum rank (position of the first 1-bit) of
+	the rest of the hashes that selected it. The relative standard error of
+	the estimate is 1.04 / sqrt(2 ** precision), e.g. 0.8% for the default
+	precision 14 (16 KB). While few registers are set, they are kept in a
+	sparse dict {register: rank}, which is converted to a dense bytearray
+	once that is smaller."""
+	
+	MIN_PRECISION = 4
+	MAX_PRECISION = 18
+	_HEADER = struct.Struct("<4sBBI")
+	_MAGIC = b"HLL1"
+	
+	def __init__(self, precision: int = 14):
+		if not self.MIN_PRECISION <= precision <= self.MAX_PRECISION:
+			raise ValueError(f"precision must be in [{self.MIN_PRECISION}, "
+			                 f"{self.MAX_PRECISION}], not {precision}.")
+		self.__precision = precision
+		self.__nr_registers = 1 << precision
+		# A dict entry and its int key take about 64 bytes, so beyond this
+		# the sparse dict is larger than the dense registers.
+		self.__max_sparse = self.__nr_registers // 64
+		self.__sparse: Optional[dict[int, int]] = {}
+		self.__registers = bytearray()
+	
+	def __str__(self) -> str:
+		return (f"precision = {self.__precision},\n"
+		        f"error     = {self.relative_error:.4f},\n"
+		        f"sparse    = {self.is_sparse}")
+	
+	def __eq__(self, other: object) -> bool:
+		if not isinstance(other, HyperLogLog):
+			return NotImplemented
+		return (self.__precision == other.__precision
+		        and self.__dense() == other.__dense())
+	
+	@property
+	def precision(self) -> int:
+		"""Return the precision: there are 2 ** precision registers."""
+		
+		return self.__precision
+	
+	@property
+	def relative_error(self) -> float:
+		"""Return the relative standard error of the estimate."""
+		
+		return 1.04 / sqrt(self.__nr_registers)
+	
+	@property
+	def is_sparse(self) -> bool:
+		"""Return True if the registers are (still) stored sparsely."""
+		
+		return self.__sparse is not None
+	
+	def __dense(self) -> bytearray:
+		"""Return the registers as a bytearray (a copy if sparse)."""
+		
+		if self.__sparse is None:
+			return self.__registers
+		registers = bytearray(self.__nr_registers)
+		for register, rank in self.__sparse.items():
+			registers[register] = rank
+		return registers
+	
+	def __densify_if_full(self) -> None:
+		if self.__sparse is not None and len(self.__sparse) > self.__max_sparse:
+			self.__registers = self.__dense()
+			self.__sparse = None
+	
+	def __register_and_rank(self, item: Item) -> tuple[int, int]:
+		"""Return the register selected by the hash of item, and the rank of
+		the remaining bits of the hash."""
+		
+		nr_bits = 64 - self.__precision
+		hash_value = int.from_bytes(prepare(item).blake2b(16)[:8], "little")
+		rest = hash_value & ((1 << nr_bits) - 1)
+		return hash_value >> nr_bits, nr_bits - rest.bit_length() + 1
+	
+	def add(self, item: Item) -> None:
+		"""Add item (adding an item more than once has no effect)."""
+		
+		register, rank = self.__register_and_rank(item)
+		if self.__sparse is not None:
+			if rank > self.__sparse.get(register, 0):
+				self.__sparse[register] = rank
+				self.__densify_if_full()
+		elif rank > self.__registers[register]:
+			self.__registers[register] = rank
+	
+	def add_many(self, items: Iterable[Item]) -> None:
+		"""Add all items."""
+		
+		for item in items:
+			self.add(item)
+	
+	def cardinality(self) -> int:
+		"""Return the estimated nr of distinct items added. Small cardinalities
+		(estimates up to 2.5 times the nr of registers, with some registers
+		still 0) are estimated by linear counting."""
+		
+		nr_registers = self.__nr_registers
+		if self.__sparse is not None:
+			nr_zeros = nr_registers - len(self.__sparse)
+			harmonic_sum = nr_zeros + sum(2.0 ** -rank
+			                              for rank in self.__sparse.values())
+		else:
+			registers = self.__registers
+			nr_zeros = registers.count(0)
+			harmonic_sum = sum(registers.count(rank) * 2.0 ** -rank
+			                   for rank in range(max(registers) + 1))
+		
+		if nr_registers >= 128:
+			alpha = 0.7213 / (1 + 1.079 / nr_registers)
+		else:
+			alpha = {16: 0.673, 32: 0.697, 64: 0.709}[nr_registers]
+		estimate = alpha * nr_registers ** 2 / harmonic_sum
+		if estimate <= 2.5 * nr_registers and nr_zeros:
+			estimate = nr_registers * log(nr_registers / nr_zeros)
+		return round(estimate)
+	
+	def __check_compatible(self, other: "HyperLogLog") -> None:
+		if self.__precision != other.__precision:
+			raise ValueError(f"HyperLogLogs of different precisions "
+			                 f"({self.__precision} and {other.__precision}) "
+			                 f"cannot be merged.")
+	
+	def update(self, other: "HyperLogLog") -> None:
+		"""Add the items added to other (with the same precision) to self."""
+		
+		self.__check_compatible(other)
+		if self.__sparse is not None and other.__sparse is not None:
+			sparse = self.__sparse
+			for register, rank in other.__sparse.items():
+				if rank > sparse.get(register, 0):
+					sparse[register] = rank
+			self.__densify_if_full()
+		else:
+			self.__registers = bytearray(map(max, self.__dense(),
+			                                 other.__dense()))
+			self.__sparse = None
+	
+	def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+		"""Return the HyperLogLog of the items added to self and other, which
+		must have the same precision."""
+		
+		merged = HyperLogLog(self.__precision)
+		merged.update(self)
+		merged.update(other)
+		return merged
+	
+	def to_bytes(self) -> bytes:
+		"""Return a portable serialization: the (register, rank) pairs if
+		sparse, else all registers."""
+		
+		if self.__sparse is None:
+			return (self._HEADER.pack(self._MAGIC, self.__precision, 0,
+			                          self.__nr_registers)
+			        + bytes(self.__registers))
+		registers = sorted(self.__sparse)
+		return (self._HEADER.pack(self._MAGIC, self.__precision, 1,
+		                          len(registers))
+		        + struct.pack(f"<{len(registers)}I", *registers)
+		        + bytes(map(self.__sparse.__getitem__, registers)))
+	
+	@classmethod
+	def from_bytes(cls, data: bytes) -> "HyperLogLog":
+		"""Return the HyperLogLog serialized in data (by to_bytes)."""
+		
+		magic, precision, sparse, size = cls._HEADER.unpack_from(data)
+		if magic != cls._MAGIC:
+			raise ValueError("Not a serialized HyperLogLog.")
+		
+		hll = cls(precision)
+		offset = cls._HEADER.size
+		if len(data) != offset + (5 if sparse else 1) * size:
+			raise ValueError("Truncated or corrupt HyperLogLog data.")
+		if sparse:
+			registers = struct.unpack_from(f"<{size}I", data, offset)
+			ranks = data[offset + 4 * size:]
+			hll.__sparse = dict(zip(registers, ranks))
+			hll.__densify_if_full()
+		else:
+			if size != hll.__nr_registers:
+				raise ValueError("Truncated or corrupt HyperLogLog data.")
+			hll.__registers = bytearray(data[offset:])
+			hll.__sparse = None
+		return hll
+
 
 # if __name__ == "__main__":
 # 	from random import choice
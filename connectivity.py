@@ -1,34 +1,601 @@
 """An attempt to solve the connectivity problem.
 - If we only need to find out about a pair (p, q) whether it IS connected,
-  but NOT HOW it is connected, things get way easier."""
-from collections import defaultdict
+  but NOT HOW it is connected, things get way easier: a disjoint-set forest
+  (UnionFind) answers that in near-constant time per pair. Edge lists too
+  large for memory are streamed into one with ingest_edges, or with
+  ingest_edges_parallel, which splits the work over several processes.
+- HOW p and q are connected is answered by a shortest path in a CSRGraph."""
+import mmap
+import os
+import sys
+from array import array
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import accumulate, chain, pairwise
+from os import PathLike, cpu_count
+from time import perf_counter
+from typing import BinaryIO, NamedTuple, Optional, TypeAlias
 
-connections = ((1, 4), (1, 3))
-con_infos: dict[int, set[int]] = defaultdict(set)
 
+class UnionFind:
+	"""Disjoint sets ('components') of the nodes 0, 1, ..., len - 1, as a
+	forest in which every node points to its parent, and the root of a tree
+	represents its component. Union by size (the root of the smaller tree
+	gets the root of the larger one as parent) and path compression (find
+	makes every node on the path point to the root) keep the trees so flat
+	that find, union and connected take near-constant amortized time. The
+	parents and the sizes of the trees are stored in arrays, so a node takes
+	16 bytes."""
 
-def check_connection(connection: tuple[int, int]) -> bool:
-	p, q = connection
-	if (cons := con_infos.get(p)) and q in cons:
-		# q already connected to p
-		print(f"{p} and {q} are already connected!")
-		# if q connected to p, then also p connected to q
-		assert p in con_infos[q]
-		# if q connected to p, then q also connected to all other connections
-		# of p
-		for c in con_infos[p]:
-			assert c in con_infos[q]
-		# if p connected to q, then p also connected to all other connections
-		# of p
-		for c in con_infos[q]:
-			assert c in con_infos[p]
+	def __init__(self, nr_nodes: int = 0):
+		if nr_nodes < 0:
+			raise ValueError(f"nr_nodes must be >= 0, not {nr_nodes}.")
+		self.__parent = array("q", range(nr_nodes))
+		self.__size = array("q", [1]) * nr_nodes
+		self.__nr_components = nr_nodes
+		self.__largest_component_size = min(nr_nodes, 1)
+
+	def __len__(self) -> int:
+		return len(self.__parent)
+
+	def __str__(self) -> str:
+		return (f"nodes      = {len(self.__parent)},\n"
+		        f"components = {self.__nr_components}")
+
+	@property
+	def nr_components(self) -> int:
+		"""Return the nr of components (a node on its own is one too)."""
+
+		return self.__nr_components
+
+	@property
+	def largest_component_size(self) -> int:
+		"""Return the nr of nodes in the largest component."""
+
+		return self.__largest_component_size
+
+	def grow(self, nr_nodes: int) -> None:
+		"""Add (unconnected) nodes until there are (at least) nr_nodes."""
+
+		old_nr_nodes = len(self.__parent)
+		if nr_nodes > old_nr_nodes:
+			self.__parent.extend(range(old_nr_nodes, nr_nodes))
+			self.__size.extend(array("q", [1]) * (nr_nodes - old_nr_nodes))
+			self.__nr_components += nr_nodes - old_nr_nodes
+			if not self.__largest_component_size:
+				self.__largest_component_size = 1
+
+	def find(self, node: int) -> int:
+		"""Return the root of the component of node."""
+
+		parent = self.__parent
+		if not 0 <= node < len(parent):
+			raise IndexError(f"node {node} out of range for UnionFind of "
+			                 f"{len(parent)} nodes.")
+		root = node
+		while (next_node := parent[root]) != root:
+			root = next_node
+		while (next_node := parent[node]) != root:
+			parent[node] = root
+			node = next_node
+		return root
+
+	def union(self, p: int, q: int) -> bool:
+		"""Connect p and q. Return True if they were not connected yet (so two
+		components were merged), else False."""
+
+		p_root, q_root = self.find(p), self.find(q)
+		if p_root == q_root:
+			return False
+
+		size = self.__size
+		if size[p_root] < size[q_root]:
+			p_root, q_root = q_root, p_root
+		self.__parent[q_root] = p_root
+		size[p_root] += size[q_root]
+		self.__nr_components -= 1
+		if size[p_root] > self.__largest_component_size:
+			self.__largest_component_size = size[p_root]
 		return True
-	else:
-		# Not connected yet
-		con_infos[p].add(q)
-		con_infos[q].add(p)
-		return False
-	
-
-for connection in connections:
-	print(check_connection(connection))
+
+	def union_pairs(self, nodes: Iterable[int]) -> int:
+		"""Connect the pairs of consecutive nodes p0, q0, p1, q1, ... (e.g. an
+		array of edges). Return the nr of components merged."""
+
+		union = self.union
+		pairs = iter(nodes)
+		return sum(map(union, pairs, pairs))
+
+	def root_pairs(self) -> "array[int]":
+		"""Return the pairs node, root (as in union_pairs) of all nodes that
+		are not a root. Replaying them in another UnionFind connects the
+		same nodes as this one, with at most one union per node."""
+
+		find = self.find
+		return array("q", [node_or_root
+		                   for node in range(len(self.__parent))
+		                   if (root := find(node)) != node
+		                   for node_or_root in (node, root)])
+
+	def connected(self, p: int, q: int) -> bool:
+		"""Return True if p and q are in the same component, else False."""
+
+		return self.find(p) == self.find(q)
+
+	def component_size(self, node: int) -> int:
+		"""Return the nr of nodes in the component of node."""
+
+		return self.__size[self.find(node)]
+
+	def components(self) -> dict[int, list[int]]:
+		"""Return the nodes of every component, by root."""
+
+		components: dict[int, list[int]] = {}
+		for node in range(len(self.__parent)):
+			components.setdefault(self.find(node), []).append(node)
+		return components
+
+
+EdgeSource: TypeAlias = "str | PathLike[str] | BinaryIO"
+"""A file name, or a file opened in binary mode, with edges."""
+
+
+class IngestStats(NamedTuple):
+	"""Progress and component statistics of ingest_edges."""
+
+	nr_edges: int
+	nr_nodes: int
+	nr_components: int
+	largest_component_size: int
+	seconds: float
+
+
+def _ingest_stats(union_find: UnionFind, nr_edges: int,
+                  start: float) -> IngestStats:
+	return IngestStats(nr_edges, len(union_find), union_find.nr_components,
+	                   union_find.largest_component_size,
+	                   perf_counter() - start)
+
+
+def _read_chunks(source: EdgeSource, chunk_size: int, use_mmap: bool,
+                 start: int = 0, stop: Optional[int] = None) \
+	-> Iterator[bytes]:
+	"""Yield the contents of source in chunks of (at most) chunk_size bytes.
+	A file name is opened, and memory-mapped if use_mmap is True, and only
+	its bytes in range(start, stop) are read."""
+
+	if not isinstance(source, (str, PathLike)):
+		yield from iter(partial(source.read, chunk_size), b"")
+		return
+
+	with open(source, "rb") as file:
+		if use_mmap:
+			try:
+				mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+			except ValueError:   # an empty file cannot be mapped
+				return
+			with mapped:
+				stop = len(mapped) if stop is None else min(stop, len(mapped))
+				for offset in range(start, stop, chunk_size):
+					yield mapped[offset:min(offset + chunk_size, stop)]
+			return
+
+		file.seek(start)
+		if stop is None:
+			yield from iter(partial(file.read, chunk_size), b"")
+			return
+		for offset in range(start, stop, chunk_size):
+			if not (data := file.read(min(chunk_size, stop - offset))):
+				return
+			yield data
+
+
+def _text_edges(data: bytes) -> "array[int]":
+	"""Return the node ids in data, lines of whitespace separated pairs of
+	ids (lines starting with '#' are comments)."""
+
+	if b"#" in data:
+		data = b"\n".join(line for line in data.splitlines()
+		                  if not line.lstrip().startswith(b"#"))
+	edges = array("q", map(int, data.split()))
+	if len(edges) % 2:
+		raise ValueError("Edge list with an odd nr of node ids.")
+	return edges
+
+
+def iter_edge_chunks(source: EdgeSource, binary: bool = False,
+                     typecode: str = "I", chunk_size: int = 1 << 20,
+                     use_mmap: bool = False, start: int = 0,
+                     stop: Optional[int] = None) -> Iterator["array[int]"]:
+	"""Yield the edges in source in chunks, each an array of the node ids
+	p0, q0, p1, q1, ... of (about) chunk_size bytes of source. A text source
+	has an edge 'p q' per line; a binary source has the pairs of ids as
+	little endian integers of array typecode typecode (by default unsigned
+	32 bit). Only one chunk is in memory at a time. Of a file name, only the
+	bytes in range(start, stop) are read (see partition_edge_file)."""
+
+	if binary:
+		pair_size = 2 * array(typecode).itemsize
+		chunk_size = max(chunk_size - chunk_size % pair_size, pair_size)
+	rest = b""
+	for data in _read_chunks(source, chunk_size, use_mmap, start, stop):
+		if rest:
+			data = rest + data
+		if binary:
+			end = len(data) - len(data) % pair_size
+			edges = array(typecode)
+			edges.frombytes(memoryview(data)[:end])
+			if sys.byteorder == "big":
+				edges.byteswap()
+		else:
+			end = data.rfind(b"\n") + 1
+			edges = _text_edges(data[:end])
+		rest = data[end:]
+		if edges:
+			yield edges
+
+	if rest:
+		if binary:
+			raise ValueError(f"Binary edge list with {len(rest)} trailing "
+			                 f"bytes.")
+		if edges := _text_edges(rest):
+			yield edges
+
+
+def _connect(union_find: UnionFind, edges: "array[int]") -> int:
+	"""Connect the edges (a chunk of iter_edge_chunks) in union_find, after
+	growing it as needed. Return the nr of edges."""
+
+	if min(edges) < 0:
+		raise ValueError("Edge list with a negative node id.")
+	union_find.grow(max(edges) + 1)
+	union_find.union_pairs(edges)
+	return len(edges) // 2
+
+
+def ingest_edges(source: EdgeSource, union_find: Optional[UnionFind] = None,
+                 binary: bool = False, typecode: str = "I",
+                 chunk_size: int = 1 << 20, use_mmap: bool = False,
+                 progress: Optional[Callable[[IngestStats], None]] = None) \
+	-> tuple[UnionFind, IngestStats]:
+	"""Connect the nodes of all edges in source (see iter_edge_chunks) in
+	union_find (by default a new UnionFind), which grows as needed for the
+	nodes. The edges are streamed, so memory use is proportional to the
+	nr of nodes, not of edges. If given, progress is called with the
+	statistics so far after every chunk. Return union_find and the final
+	statistics."""
+
+	if union_find is None:
+		union_find = UnionFind()
+	start = perf_counter()
+	nr_edges = 0
+	for edges in iter_edge_chunks(source, binary, typecode, chunk_size,
+	                              use_mmap):
+		nr_edges += _connect(union_find, edges)
+		if progress is not None:
+			progress(_ingest_stats(union_find, nr_edges, start))
+	return union_find, _ingest_stats(union_find, nr_edges, start)
+
+
+def partition_edge_file(filename: str | PathLike[str], nr_parts: int,
+                        binary: bool = False, typecode: str = "I") \
+	-> list[tuple[int, int]]:
+	"""Return (at most) nr_parts (start, stop) byte ranges of about equal
+	size that together cover the edge file, each starting at an edge (a
+	line of a text file, a pair of ids of a binary file)."""
+
+	size = os.path.getsize(filename)
+	pair_size = 2 * array(typecode).itemsize
+	boundaries = [0]
+	with open(filename, "rb") as file:
+		for part in range(1, nr_parts):
+			offset = max(size * part // nr_parts, boundaries[-1])
+			if binary:
+				offset -= offset % pair_size
+			elif offset:
+				# Move to the start of the next line.
+				file.seek(offset - 1)
+				offset += len(file.readline()) - 1
+			boundaries.append(min(offset, size))
+	boundaries.append(size)
+	return [(start, stop) for start, stop in pairwise(boundaries)
+	        if start < stop]
+
+
+def _local_forest(filename: str | PathLike[str], binary: bool, typecode: str,
+                  chunk_size: int, use_mmap: bool, start: int, stop: int) \
+	-> tuple[int, int, "array[int]"]:
+	"""Connect the edges in range(start, stop) of the edge file in a new
+	UnionFind. Return the nr of edges, and the nr of nodes and the root pairs
+	of the UnionFind."""
+
+	union_find = UnionFind()
+	nr_edges = 0
+	for edges in iter_edge_chunks(filename, binary, typecode, chunk_size,
+	                              use_mmap, start, stop):
+		nr_edges += _connect(union_find, edges)
+	return nr_edges, len(union_find), union_find.root_pairs()
+
+
+def ingest_edges_parallel(filename: str | PathLike[str],
+                          binary: bool = False, typecode: str = "I",
+                          chunk_size: int = 1 << 20, use_mmap: bool = False,
+                          processes: Optional[int] = None) \
+	-> tuple[UnionFind, IngestStats]:
+	"""Connect the nodes of all edges in the edge file (see ingest_edges)
+	using processes processes (by default one per CPU). The file is
+	partitioned (see partition_edge_file), every process connects the
+	edges of a part in its own UnionFind, and these are merged by replaying
+	their root pairs (see UnionFind.root_pairs). That is at most one union
+	per node per part, instead of one per edge, and gives the same
+	components as ingest_edges."""
+
+	start = perf_counter()
+	if processes is None:
+		processes = cpu_count() or 1
+	parts = partition_edge_file(filename, processes, binary, typecode)
+	union_find = UnionFind()
+	nr_edges = 0
+	with ProcessPoolExecutor(max(len(parts), 1)) as executor:
+		futures = [executor.submit(_local_forest, filename, binary, typecode,
+		                           chunk_size, use_mmap, part_start, part_stop)
+		           for part_start, part_stop in parts]
+		for future in futures:
+			nr_part_edges, nr_nodes, root_pairs = future.result()
+			nr_edges += nr_part_edges
+			union_find.grow(nr_nodes)
+			union_find.union_pairs(root_pairs)
+	return union_find, _ingest_stats(union_find, nr_edges, start)
+
+
+class CSRGraph:
+	"""A graph of the nodes 0, 1, ..., nr_nodes - 1 in compressed sparse row
+	form: the neighbours of node are targets[offsets[node]:offsets[node + 1]]
+	(in the order of the edges). Both are arrays, so an edge takes 8 bytes
+	(16 if undirected, as it is stored in both directions) and a node 8
+	bytes. Answers HOW nodes are connected: bfs finds the distances from a
+	node, and shortest_path a shortest path between two nodes."""
+
+	def __init__(self, offsets: "array[int]", targets: "array[int]",
+	             directed: bool = False):
+		if (not offsets or offsets[0] != 0 or offsets[-1] != len(targets)
+		        or any(map(int.__gt__, offsets, offsets[1:]))):
+			raise ValueError("offsets must rise from 0 to len(targets).")
+		self.__offsets = offsets
+		self.__targets = targets
+		self.__directed = directed
+		self.__transpose: Optional[CSRGraph] = None if directed else self
+
+	@classmethod
+	def __from_chunks(cls, chunks: Callable[[], Iterable["array[int]"]],
+	                  nr_nodes: int, directed: bool) -> "CSRGraph":
+		"""Return the graph of the edges in the chunks of node ids p0, q0, p1,
+		q1, ... that chunks() returns (twice: once to count the degrees, once
+		to fill in the targets)."""
+
+		degrees = array("q", bytes(8 * (nr_nodes + 1)))
+		for edges in chunks():
+			if edges and min(edges) < 0:
+				raise ValueError("Edge list with a negative node id.")
+			if edges and max(edges) >= nr_nodes:
+				degrees.extend(array("q", bytes(8 * (max(edges) + 1
+				                                      - nr_nodes))))
+				nr_nodes = max(edges) + 1
+			for p in edges[0::2]:
+				degrees[p + 1] += 1
+			if not directed:
+				for q in edges[1::2]:
+					degrees[q + 1] += 1
+
+		offsets = array("q", accumulate(degrees))
+		positions = offsets[:-1]
+		targets = array("q", bytes(8 * offsets[-1]))
+		for edges in chunks():
+			pairs = iter(edges)
+			for p, q in zip(pairs, pairs):
+				targets[positions[p]] = q
+				positions[p] += 1
+				if not directed:
+					targets[positions[q]] = p
+					positions[q] += 1
+		return cls(offsets, targets, directed)
+
+	@classmethod
+	def from_edges(cls, edges: Iterable[tuple[int, int]], nr_nodes: int = 0,
+	               directed: bool = False) -> "CSRGraph":
+		"""Return the graph with the edges (p, q), and (at least) nr_nodes
+		nodes. If not directed, an edge connects both p to q and q to p."""
+
+		flat = array("q", chain.from_iterable(edges))
+		return cls.__from_chunks(lambda: (flat,), nr_nodes, directed)
+
+	@classmethod
+	def from_edge_file(cls, filename: str | PathLike[str],
+	                   binary: bool = False, typecode: str = "I",
+	                   chunk_size: int = 1 << 20, use_mmap: bool = False,
+	                   nr_nodes: int = 0, directed: bool = False) \
+		-> "CSRGraph":
+		"""Return the graph of the edges in the edge file (see
+		iter_edge_chunks), which is streamed twice, so the edges are never
+		all in memory but in the graph."""
+
+		return cls.__from_chunks(
+			lambda: iter_edge_chunks(filename, binary, typecode, chunk_size,
+			                         use_mmap),
+			nr_nodes, directed)
+
+	def __len__(self) -> int:
+		return len(self.__offsets) - 1
+
+	def __str__(self) -> str:
+		return (f"nodes    = {len(self)},\n"
+		        f"edges    = {self.nr_edges},\n"
+		        f"directed = {self.__directed}")
+
+	@property
+	def directed(self) -> bool:
+		"""Return True if the graph is directed."""
+
+		return self.__directed
+
+	@property
+	def nr_edges(self) -> int:
+		"""Return the nr of edges (an undirected edge counts once)."""
+
+		if self.__directed:
+			return len(self.__targets)
+		return len(self.__targets) // 2
+
+	@property
+	def nbytes(self) -> int:
+		"""Return the nr of bytes of the offsets and targets."""
+
+		return 8 * (len(self.__offsets) + len(self.__targets))
+
+	def __check_node(self, node: int) -> None:
+		if not 0 <= node < len(self):
+			raise IndexError(f"node {node} out of range for CSRGraph of "
+			                 f"{len(self)} nodes.")
+
+	def degree(self, node: int) -> int:
+		"""Return the nr of (outgoing) edges of node."""
+
+		self.__check_node(node)
+		return self.__offsets[node + 1] - self.__offsets[node]
+
+	def neighbours(self, node: int) -> "array[int]":
+		"""Return the nodes that an edge of node leads to."""
+
+		self.__check_node(node)
+		return self.__targets[self.__offsets[node]:self.__offsets[node + 1]]
+
+	def transpose(self) -> "CSRGraph":
+		"""Return the graph with all edges reversed (the graph itself if it is
+		undirected). It is built once, on first use."""
+
+		if self.__transpose is None:
+			offsets, targets = self.__offsets, self.__targets
+			degrees = array("q", bytes(8 * (len(self) + 1)))
+			for target in targets:
+				degrees[target + 1] += 1
+			sources_offsets = array("q", accumulate(degrees))
+			positions = sources_offsets[:-1]
+			sources = array("q", bytes(8 * len(targets)))
+			for node in range(len(self)):
+				for target in targets[offsets[node]:offsets[node + 1]]:
+					sources[positions[target]] = node
+					positions[target] += 1
+			self.__transpose = CSRGraph(sources_offsets, sources, True)
+			self.__transpose.__transpose = self
+		return self.__transpose
+
+	def bfs(self, source: int) -> "array[int]":
+		"""Return the distance (nr of edges) from source to every node, or -1
+		for nodes that cannot be reached, by breadth-first search."""
+
+		self.__check_node(source)
+		offsets, targets = self.__offsets, self.__targets
+		distances = array("q", [-1]) * len(self)
+		distances[source] = distance = 0
+		frontier = [source]
+		while frontier:
+			distance += 1
+			next_frontier = []
+			for node in frontier:
+				for target in targets[offsets[node]:offsets[node + 1]]:
+					if distances[target] < 0:
+						distances[target] = distance
+						next_frontier.append(target)
+			frontier = next_frontier
+		return distances
+
+	@staticmethod
+	def __expand(graph: "CSRGraph", frontier: list[int],
+	             parents: dict[int, int], distances: dict[int, int],
+	             others: dict[int, int]) -> tuple[list[int], Optional[int]]:
+		"""Extend the search tree (parents and distances) of a BFS in graph by
+		the level after frontier. Return the next frontier, and the node
+		found by the other search (with distances others) with the least
+		total distance, or None if there is none."""
+
+		offsets, targets = graph.__offsets, graph.__targets
+		next_frontier = []
+		meeting_node = None
+		for node in frontier:
+			distance = distances[node] + 1
+			for target in targets[offsets[node]:offsets[node + 1]]:
+				if target not in parents:
+					parents[target] = node
+					distances[target] = distance
+					next_frontier.append(target)
+					if target in others and (
+						meeting_node is None
+						or others[target] < others[meeting_node]):
+						meeting_node = target
+		return next_frontier, meeting_node
+
+	def shortest_path(self, source: int, target: int,
+	                  bidirectional: bool = True) -> Optional[list[int]]:
+		"""Return a shortest path from source to target, as the list of its
+		nodes (from source to target), or None if there is none. The
+		bidirectional search alternately extends a BFS from source and a BFS
+		(over the transposed graph) from target, always the one with the
+		smaller frontier, until they meet: for a path of length d through
+		nodes of degree b that visits about 2 b^(d/2) instead of b^d nodes.
+		If bidirectional is False, only the BFS from source is extended."""
+
+		self.__check_node(source)
+		self.__check_node(target)
+		forward_parents = {source: source}
+		forward_distances = {source: 0}
+		backward_parents = {target: target}
+		backward_distances = {target: 0}
+		if source == target:
+			return [source]
+
+		forward_frontier, backward_frontier = [source], [target]
+		meeting_node = None
+		while forward_frontier and backward_frontier and meeting_node is None:
+			if not bidirectional or (len(forward_frontier)
+			                         <= len(backward_frontier)):
+				forward_frontier, meeting_node = self.__expand(
+					self, forward_frontier, forward_parents,
+					forward_distances, backward_distances)
+			else:
+				backward_frontier, meeting_node = self.__expand(
+					self.transpose(), backward_frontier, backward_parents,
+					backward_distances, forward_distances)
+		if meeting_node is None:
+			return None
+
+		path = [meeting_node]
+		while (node := path[-1]) != source:
+			path.append(forward_parents[node])
+		path.reverse()
+		while (node := path[-1]) != target:
+			path.append(backward_parents[node])
+		return path
+
+
+_connections = UnionFind()
+
+
+def check_connection(connection: tuple[int, int],
+                     union_find: Optional[UnionFind] = None) -> bool:
+	"""Return True if the nodes p and q of connection are already connected,
+	else connect them and return False. The connections are kept in
+	union_find (by default a module-level UnionFind), which grows as needed
+	for the nodes."""
+
+	if union_find is None:
+		union_find = _connections
+	p, q = connection
+	union_find.grow(max(p, q) + 1)
+	return not union_find.union(p, q)
+
+
+if __name__ == "__main__":
+	connections = ((1, 4), (1, 3), (3, 4))
+	for connection in connections:
+		print(connection, check_connection(connection))
@@ -1,8 +1,13 @@
 """Some math stuff"""
-from collections.abc import Sequence
-from functools import partial, lru_cache
+import sys
+from array import array
+from collections.abc import Iterable, Iterator, Sequence
+from functools import cached_property, partial, lru_cache
 from cmath import sqrt as csqrt
+from itertools import islice
+from fractions import Fraction
 from math import copysign, isclose
+from numbers import Number
 from random import randint
 from time import perf_counter_ns
 from typing import Optional, Any, cast
@@ -25,6 +30,446 @@ def horner_polynomial(coefficients: Sequence[Any], x: Any) -> Any:
 	return p
 
 
+def _numpy_array(xs: Any) -> bool:
+	"""Return True if xs is a NumPy array. NumPy is an optional dependency,
+	so it is not imported: if it was not imported, xs cannot be one."""
+	
+	numpy = sys.modules.get("numpy")
+	return numpy is not None and isinstance(xs, numpy.ndarray)
+
+
+def horner_polynomial_many(coefficients: Sequence[Any], xs: Any) -> Any:
+	"""Return the values of the polynomial with coefficients (in the order of
+	horner_polynomial) at all x values in xs, running Horner's scheme over
+	all of them at once: per coefficient, one multiplication and one
+	addition of whole vectors instead of a Python loop over the points.
+	- A NumPy array xs gives a NumPy array (of the dtype of xs and the
+	  coefficients; beware that integer dtypes overflow silently).
+	- An array.array xs gives an array.array of floats ('d'), computed with
+	  NumPy if that is installed.
+	- Any other sequence gives a list (exact for int coefficients and xs).
+	Without NumPy, the points are evaluated one by one: vector operations on
+	lists cost more than they save, as they create every value twice."""
+	
+	if _numpy_array(xs):
+		numpy = sys.modules["numpy"]
+		values = numpy.zeros(xs.shape, numpy.result_type(xs, *coefficients))
+		for coefficient in coefficients:
+			values *= xs
+			values += coefficient
+		return values
+	
+	if isinstance(xs, array):
+		try:
+			import numpy   # type: ignore
+		except ImportError:
+			return array("d", [horner_polynomial(coefficients, x)
+			                   for x in xs])
+		return array("d", horner_polynomial_many(
+			coefficients, numpy.asarray(xs, dtype=numpy.float64)).tobytes())
+	
+	return [horner_polynomial(coefficients, x) for x in xs]
+
+
+def iter_horner_polynomial(coefficients: Sequence[Any], xs: Iterable[Any],
+                           chunk_size: int = 1 << 16) -> Iterator[Any]:
+	"""Yield the values of the polynomial with coefficients at the x values
+	in xs in chunks of (at most) chunk_size values, each as returned by
+	horner_polynomial_many, so only one chunk of x values and values is in
+	memory at a time. A NumPy array (e.g. a numpy.memmap of a file too large
+	for memory) or array.array xs is sliced; any other iterable (e.g. a
+	generator reading a file) is read in chunks of lists, so ints stay exact
+	and any number type (Fraction, Decimal, complex) can be used."""
+	
+	if chunk_size < 1:
+		raise ValueError(f"chunk_size must be >= 1, not {chunk_size}")
+	
+	if isinstance(xs, array) or _numpy_array(xs):
+		sliceable = cast(Sequence[Any], xs)
+		for start in range(0, len(sliceable), chunk_size):
+			yield horner_polynomial_many(
+				coefficients, sliceable[start:start + chunk_size])
+		return
+	
+	iterator = iter(xs)
+	while chunk := list(islice(iterator, chunk_size)):
+		yield horner_polynomial_many(coefficients, chunk)
+
+
+# Polynomial arithmetic on lists of coefficients in ASCENDING order (a_0,
+# a_1, ..., a_n), the reverse of the order of horner_polynomial, without
+# trailing zeros (the zero polynomial is []).
+_KARATSUBA_THRESHOLD = 32
+_NEWTON_DIVISION_THRESHOLD = 64
+_SUBPRODUCT_LEAF_SIZE = 32
+
+
+def _as_int(value: Any) -> Any:
+	"""Return value as an int if it is a whole Fraction, else value."""
+	
+	if isinstance(value, Fraction) and value.denominator == 1:
+		return value.numerator
+	return value
+
+
+def _divide(a: Any, b: Any) -> Any:
+	"""Return a / b, as an int if exact, or a Fraction, if both are ints, so
+	int polynomials are divided exactly."""
+	
+	if type(a) is int and type(b) is int:
+		return _as_int(Fraction(a, b))
+	return a / b
+
+
+def _trim(a: list[Any]) -> list[Any]:
+	while a and not a[-1]:
+		a.pop()
+	return a
+
+
+def _add(a: list[Any], b: list[Any]) -> list[Any]:
+	if len(a) < len(b):
+		a, b = b, a
+	result = a[:]
+	for i, coefficient in enumerate(b):
+		result[i] += coefficient
+	return result
+
+
+def _sub(a: list[Any], b: list[Any]) -> list[Any]:
+	return _add(a, [-coefficient for coefficient in b])
+
+
+def _pack(a: list[int], width: int) -> int:
+	"""Return a(2^(8 width)) for int coefficients a of at most width bytes,
+	packing the positive and the negative coefficients separately."""
+	
+	positive = b"".join((coefficient if coefficient > 0 else 0)
+	                    .to_bytes(width, "little") for coefficient in a)
+	negative = b"".join((-coefficient if coefficient < 0 else 0)
+	                    .to_bytes(width, "little") for coefficient in a)
+	return (int.from_bytes(positive, "little")
+	        - int.from_bytes(negative, "little"))
+
+
+def _kronecker_mul(a: list[int], b: list[int]) -> list[int]:
+	"""Kronecker substitution: a(X) b(X) for X = 2^(8 width), with width
+	bytes enough for every coefficient of the product, is one (C speed) int
+	product, from whose bytes the coefficients are read (as digits in
+	[-X / 2, X / 2), since coefficients can be negative)."""
+	
+	bound = max(map(abs, a)) * max(map(abs, b)) * min(len(a), len(b))
+	width = bound.bit_length() // 8 + 1
+	value = _pack(a, width) * _pack(b, width)
+	data = abs(value).to_bytes(width * (len(a) + len(b)), "little")
+	half = 1 << (8 * width - 1)
+	result = []
+	carry = 0
+	for start in range(0, width * (len(a) + len(b) - 1), width):
+		digit = int.from_bytes(data[start:start + width], "little") + carry
+		carry = digit >= half
+		result.append(digit - (half << 1) if carry else digit)
+	return result if value >= 0 else [-digit for digit in result]
+
+
+def _mul(a: list[Any], b: list[Any]) -> list[Any]:
+	"""Karatsuba multiplication: split a = a0 + x^h a1 and b = b0 + x^h b1,
+	then a b = a0 b0 + x^h ((a0 + a1)(b0 + b1) - a0 b0 - a1 b1)
+	+ x^2h a1 b1 needs 3 instead of 4 half size products, so O(n^1.58)
+	instead of O(n^2) work. Small products are done the schoolbook way, and
+	products of int polynomials by Kronecker substitution."""
+	
+	if not a or not b:
+		return []
+	if (min(len(a), len(b)) > 4 and all(type(c) is int for c in a)
+	        and all(type(c) is int for c in b)):
+		return _kronecker_mul(a, b)
+	if min(len(a), len(b)) <= _KARATSUBA_THRESHOLD:
+		result = [0 * a[0]] * (len(a) + len(b) - 1)
+		for i, a_i in enumerate(a):
+			if a_i:
+				for j, b_j in enumerate(b, i):
+					result[j] += a_i * b_j
+		return result
+	
+	half = max(len(a), len(b)) // 2
+	a0, a1, b0, b1 = a[:half], a[half:], b[:half], b[half:]
+	low, high = _mul(a0, b0), _mul(a1, b1)
+	middle = _sub(_sub(_mul(_add(a0, a1), _add(b0, b1)), low), high)
+	result = [0 * a[0]] * (len(a) + len(b) - 1)
+	for offset, part in ((0, low), (half, middle), (2 * half, high)):
+		for i, coefficient in enumerate(part, offset):
+			if i < len(result):
+				result[i] += coefficient
+	return result
+
+
+def _inverse_series(a: list[Any], n: int) -> list[Any]:
+	"""Return the first n coefficients of the power series 1 / a (a[0] must
+	not be 0), by Newton iteration: g = g (2 - a g) doubles the nr of
+	correct coefficients of g per step, so this costs a few products."""
+	
+	inverse = [_divide(1, a[0])]
+	nr_correct = 1
+	while nr_correct < n:
+		nr_correct = min(2 * nr_correct, n)
+		error = [-coefficient
+		         for coefficient in _mul(a[:nr_correct], inverse)[:nr_correct]]
+		error[0] += 2
+		inverse = _mul(inverse, error)[:nr_correct]
+	return inverse
+
+
+def _divmod(a: list[Any], b: list[Any]) -> tuple[list[Any], list[Any]]:
+	"""Return quotient and remainder of a divided by b (not zero). Large
+	quotients are computed as the reverse of reverse(a) / reverse(b) as power
+	series (see _inverse_series), in a few products instead of the
+	quadratic long division."""
+	
+	if len(a) < len(b):
+		return [], a[:]
+	nr_quotient = len(a) - len(b) + 1
+	if nr_quotient > _NEWTON_DIVISION_THRESHOLD \
+		and len(b) > _KARATSUBA_THRESHOLD:
+		reverse_quotient = _mul(a[::-1][:nr_quotient],
+		                        _inverse_series(b[::-1], nr_quotient))
+		quotient = reverse_quotient[:nr_quotient][::-1]
+		return quotient, _trim(_sub(a, _mul(quotient, b))[:len(b) - 1])
+	
+	remainder = a[:]
+	quotient = [0 * a[0]] * nr_quotient
+	lead = b[-1]
+	for i in range(nr_quotient - 1, -1, -1):
+		coefficient = remainder[i + len(b) - 1]
+		if coefficient:
+			coefficient = _divide(coefficient, lead)
+			quotient[i] = coefficient
+			for j, b_j in enumerate(b, i):
+				remainder[j] -= coefficient * b_j
+	return _trim(quotient), _trim(remainder[:len(b) - 1])
+
+
+def _subproduct_tree(xs: Sequence[Any]) -> list[list[list[Any]]]:
+	"""Return the levels of the subproduct tree of xs: level 0 has the
+	polynomials x - x_i, every next level the products of pairs of the
+	previous one (an odd one out is passed on), the last level only the
+	product of all x - x_i."""
+	
+	levels = [[[-x, 1] for x in xs]]
+	while len(levels[-1]) > 1:
+		level = levels[-1]
+		levels.append([_mul(level[i], level[i + 1])
+		               if i + 1 < len(level) else level[i]
+		               for i in range(0, len(level), 2)])
+	return levels
+
+
+def _evaluate_in_tree(a: list[Any], levels: list[list[list[Any]]],
+                      xs: Sequence[Any]) -> list[Any]:
+	"""Return a at all xs, given their subproduct tree: a node takes the
+	remainder of the polynomial of its parent modulo its own product, so the
+	degrees halve per level. Once the nodes cover few points, their
+	remainders are evaluated at those points with Horner."""
+	
+	depth = len(levels) - 1
+	remainders = [_divmod(a, levels[depth][0])[1]]
+	while depth and 1 << depth > _SUBPRODUCT_LEAF_SIZE:
+		depth -= 1
+		remainders = [_divmod(remainders[i // 2], node)[1]
+		              for i, node in enumerate(levels[depth])]
+	
+	span = 1 << depth   # the nr of points covered by a node
+	values: list[Any] = []
+	for i, remainder in enumerate(remainders):
+		coefficients = remainder[::-1]
+		values.extend(horner_polynomial(coefficients, x)
+		              for x in xs[i * span:(i + 1) * span])
+	return values
+
+
+def _interpolate_in_tree(weights: Sequence[Any],
+                         levels: list[list[list[Any]]]) -> list[Any]:
+	"""Return the sum of weights[i] times the product of all x - x_j with
+	j != i, given the subproduct tree of the x_i, by combining up the tree:
+	a node gets left * (product of right) + right * (product of left)."""
+	
+	parts = [[weight] for weight in weights]
+	for level in levels[:-1]:
+		parts = [_add(_mul(parts[i], level[i + 1]),
+		              _mul(parts[i + 1], level[i]))
+		         if i + 1 < len(parts) else parts[i]
+		         for i in range(0, len(parts), 2)]
+	return _trim(parts[0])
+
+
+class Polynomial:
+	"""A polynomial P(x) = a_n x^n + a_{n-1} x^{n-1} + ... + a_1 x + a_0,
+	with coefficients in the order of horner_polynomial: a_n, ..., a_0 (the
+	zero polynomial has none). Supports +, -, * (Karatsuba), divmod (by
+	Newton iteration for large quotients), evaluation at one point (Horner)
+	or at many (vectorized Horner, or a subproduct tree), interpolation, and
+	a cached derivative. These are exact for int and Fraction coefficients
+	and points; with floats, the subproduct tree algorithms are numerically
+	unstable for high degrees."""
+	
+	def __init__(self, coefficients: Iterable[Any] = ()):
+		coefficients = list(coefficients)
+		start = 0
+		while start < len(coefficients) and not coefficients[start]:
+			start += 1
+		self.__coefficients = tuple(coefficients[start:])
+	
+	@classmethod
+	def _from_ascending(cls, ascending: list[Any]) -> "Polynomial":
+		"""Return the polynomial with coefficients a_0, a_1, ..., a_n."""
+		
+		return cls(reversed(ascending))
+	
+	def _ascending(self) -> list[Any]:
+		"""Return the coefficients a_0, a_1, ..., a_n."""
+		
+		return list(reversed(self.__coefficients))
+	
+	@property
+	def coefficients(self) -> tuple[Any, ...]:
+		"""Return the coefficients a_n, ..., a_0."""
+		
+		return self.__coefficients
+	
+	@property
+	def degree(self) -> int:
+		"""Return the degree n (-1 for the zero polynomial)."""
+		
+		return len(self.__coefficients) - 1
+	
+	def __repr__(self) -> str:
+		return f"Polynomial({list(self.__coefficients)})"
+	
+	def __eq__(self, other: object) -> bool:
+		if not isinstance(other, Polynomial):
+			return NotImplemented
+		return self.__coefficients == other.__coefficients
+	
+	def __hash__(self) -> int:
+		return hash(self.__coefficients)
+	
+	def __call__(self, x: Any) -> Any:
+		return horner_polynomial(self.__coefficients, x)
+	
+	@staticmethod
+	def __as_polynomial(other: Any) -> Optional["Polynomial"]:
+		if isinstance(other, Polynomial):
+			return other
+		if isinstance(other, Number):
+			return Polynomial([other])
+		return None
+	
+	def __add__(self, other: Any) -> "Polynomial":
+		if (polynomial := self.__as_polynomial(other)) is None:
+			return NotImplemented
+		return self._from_ascending(_trim(_add(self._ascending(),
+		                                       polynomial._ascending())))
+	
+	__radd__ = __add__
+	
+	def __neg__(self) -> "Polynomial":
+		return Polynomial(-coefficient for coefficient in self.__coefficients)
+	
+	def __sub__(self, other: Any) -> "Polynomial":
+		if (polynomial := self.__as_polynomial(other)) is None:
+			return NotImplemented
+		return self + -polynomial
+	
+	def __rsub__(self, other: Any) -> "Polynomial":
+		if (polynomial := self.__as_polynomial(other)) is None:
+			return NotImplemented
+		return polynomial - self
+	
+	def __mul__(self, other: Any) -> "Polynomial":
+		if (polynomial := self.__as_polynomial(other)) is None:
+			return NotImplemented
+		return self._from_ascending(_mul(self._ascending(),
+		                                 polynomial._ascending()))
+	
+	__rmul__ = __mul__
+	
+	def __divmod__(self, other: Any) -> tuple["Polynomial", "Polynomial"]:
+		if (polynomial := self.__as_polynomial(other)) is None:
+			return NotImplemented
+		if not polynomial.__coefficients:
+			raise ZeroDivisionError("division by the zero polynomial")
+		quotient, remainder = _divmod(self._ascending(),
+		                              polynomial._ascending())
+		return self._from_ascending(quotient), self._from_ascending(remainder)
+	
+	def __floordiv__(self, other: Any) -> "Polynomial":
+		if (polynomial := self.__as_polynomial(other)) is None:
+			return NotImplemented
+		return divmod(self, polynomial)[0]
+	
+	def __mod__(self, other: Any) -> "Polynomial":
+		if (polynomial := self.__as_polynomial(other)) is None:
+			return NotImplemented
+		return divmod(self, polynomial)[1]
+	
+	@cached_property
+	def derivative(self) -> "Polynomial":
+		"""Return the derivative (computed once)."""
+		
+		degree = self.degree
+		return Polynomial(coefficient * (degree - i) for i, coefficient
+		                  in enumerate(self.__coefficients[:-1]))
+	
+	def evaluate_many(self, xs: Any) -> Any:
+		"""Return the values at all x values in xs, by vectorized Horner (see
+		horner_polynomial_many)."""
+		
+		return horner_polynomial_many(self.__coefficients, xs)
+	
+	def evaluate_at(self, xs: Sequence[Any], method: str = "horner") \
+		-> list[Any]:
+		"""Return the values at all points xs, by Horner at every point
+		(method "horner", O(n^2) arithmetic operations for degree n and n
+		points), or by the subproduct tree of the points (method "tree", see
+		_evaluate_in_tree): O(M(n) log n) operations, with M(n) those of a
+		product of degree n polynomials. The tree only pays off for exact
+		arithmetic with a fixed cost per operation (e.g. modular integers):
+		with ints and Fractions, its numbers grow so large that Horner is
+		much faster, and with floats, complex numbers and Decimals the tree
+		is numerically unstable (its results are garbage)."""
+		
+		if method not in ("horner", "tree"):
+			raise ValueError(f"Unknown method {method!r} (must be \"horner\" "
+			                 f"or \"tree\").")
+		if (method == "horner" or len(xs) <= _SUBPRODUCT_LEAF_SIZE
+		        or self.degree <= _SUBPRODUCT_LEAF_SIZE):
+			return [self(x) for x in xs]
+		return _evaluate_in_tree(self._ascending(), _subproduct_tree(xs), xs)
+	
+	@classmethod
+	def interpolate(cls, xs: Sequence[Any], ys: Sequence[Any]) \
+		-> "Polynomial":
+		"""Return the polynomial of degree < len(xs) with value ys[i] at
+		xs[i], for distinct xs. With M the product of all x - x_i, it is the
+		sum of ys[i] / M'(xs[i]) times M / (x - x_i), evaluated and summed
+		in the subproduct tree of xs in O(M(n) log n) work."""
+		
+		if len(xs) != len(ys):
+			raise ValueError(f"xs and ys must have the same length, not "
+			                 f"{len(xs)} and {len(ys)}")
+		if not xs:
+			return cls()
+		levels = _subproduct_tree(xs)
+		derivative = cls._from_ascending(levels[-1][0]).derivative
+		denominators = _evaluate_in_tree(derivative._ascending(), levels, xs)
+		if not all(denominators):
+			raise ValueError("xs must be distinct")
+		weights = [_divide(y, denominator)
+		           for y, denominator in zip(ys, denominators)]
+		return cls._from_ascending(list(map(
+			_as_int, _interpolate_in_tree(weights, levels))))
+
+
 """Python has no sign function of its own. Since math.copysign(x, y) returns a
 float with the magnitude (absolute value) of x but the sign of y, we have:
 a) if y < 0 then sign(y) = math.copysign(1, y) == -1.0,
@@ -34,19 +479,49 @@ returns -1.0."""
 sign = partial(copysign, 1)
 
 
-@lru_cache(maxsize=None)
-def _power_pos_exp(base: Any, exponent: Any) -> Any:
-	"""Cached power functon for POSITIVE or ZERO exponents only! Is much faster
-	than math.pow() function, but much slower than horner() function."""
+POWER_CACHE_SIZE = 1024
+"""Default maximum nr of (base, exponent) pairs cached by _power_pos_exp."""
+
+
+def _square_and_multiply(base: Any, exponent: Any) -> Any:
+	"""Power function for POSITIVE or ZERO exponents only! The integer part n
+	of exponent is done by exponentiation by squaring: base^n is the product
+	of the squares base^(2^i) for the bits i set in n, so it takes O(log n)
+	multiplications (and no recursion). A fractional part f is done by
+	pow(base, f)."""
 
 	if sign(exponent) == -1.0:
 		raise ValueError(f"exponent must be >= 0, not {exponent}")
 
-	if abs(exponent) <= 1.0:
-		return pow(base, exponent)
-		# return base ** exponent
-		
-	return base * _power_pos_exp(base, exponent - 1)
+	integer = int(exponent)
+	result = pow(base, exponent - integer)
+	square = base
+	while integer:
+		if integer & 1:
+			result *= square
+		integer >>= 1
+		if integer:
+			square *= square
+	return result
+
+
+_power_pos_exp = lru_cache(maxsize=POWER_CACHE_SIZE)(_square_and_multiply)
+
+
+def set_power_cache_size(maxsize: Optional[int]) -> None:
+	"""Set the maximum nr of (base, exponent) pairs cached by _power_pos_exp
+	(None for unbounded, which leaks memory in long running processes).
+	Clears the cache."""
+
+	global _power_pos_exp
+	_power_pos_exp = lru_cache(maxsize=maxsize)(_square_and_multiply)
+
+
+def power_cache_info() -> Any:
+	"""Return the statistics of the power cache: hits, misses, maxsize and
+	currsize (see functools.lru_cache)."""
+
+	return _power_pos_exp.cache_info()
 
 
 def _power(base: Any, exponent: Any) -> Any:
@@ -136,6 +611,6 @@ if __name__ == "__main__":
 
 		print(f"{h_total = :12d}")
 		print(f"{n_total = :12d}")
-		print(_power_pos_exp.cache_info())
+		print(power_cache_info())
 
 	timing()
@@ -0,0 +1,424 @@
+"""A compressed (Roaring-style) bitmap with the indexing interface of BitArray.
+
+The bit indices are split into a 16-bit high part (the key of a 'chunk' of
+65536 bits) and a 16-bit low part. Only chunks with at least one set bit are
+stored, each in the cheapest of three containers:
+- an array container: a sorted array of low parts (at most 4096 of them),
+- a bitmap container: a BitArray of 65536 bits (8 KiB),
+- a run container: sorted runs of consecutive set bits (see run_optimize).
+A sparse set spanning a huge range therefore costs about two bytes per set
+bit instead of one bit per possible index."""
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections.abc import Iterator
+from typing import Any, TypeAlias
+
+from bitarray import BitArray
+
+_CHUNK_BITS = 1 << 16
+_ARRAY_MAX = 4096   # larger array containers would be larger than bitmaps
+
+
+def _native_to_little(values: "array[int]") -> bytes:
+	"""Return the bytes of values in little endian order."""
+
+	if sys.byteorder == "big":
+		values = array(values.typecode, values)
+		values.byteswap()
+	return values.tobytes()
+
+
+def _little_to_native(typecode: str, data: bytes) -> "array[int]":
+	"""Return an array with the little endian values in data."""
+
+	values = array(typecode, data)
+	if sys.byteorder == "big":
+		values.byteswap()
+	return values
+
+
+class _ArrayContainer:
+	"""A sorted array of the low parts of the set bits in a chunk."""
+
+	KIND = 0
+
+	def __init__(self, values: "array[int]") -> None:
+		self.values = values
+
+	def __len__(self) -> int:
+		return len(self.values)
+
+	def __contains__(self, low: int) -> bool:
+		i = bisect_left(self.values, low)
+		return i < len(self.values) and self.values[i] == low
+
+	def __iter__(self) -> Iterator[int]:
+		return iter(self.values)
+
+	@property
+	def nbytes(self) -> int:
+		return 2 * len(self.values)
+
+	def add(self, low: int) -> "_Container":
+		if low not in self:
+			if len(self.values) == _ARRAY_MAX:
+				return _BitmapContainer(self.to_bit_array(),
+				                        len(self.values)).add(low)
+			insort(self.values, low)
+		return self
+
+	def discard(self, low: int) -> "_Container":
+		i = bisect_left(self.values, low)
+		if i < len(self.values) and self.values[i] == low:
+			del self.values[i]
+		return self
+
+	def copy(self) -> "_ArrayContainer":
+		return _ArrayContainer(array("H", self.values))
+
+	def to_bit_array(self) -> BitArray:
+		bit_array = BitArray(_CHUNK_BITS)
+		for low in self.values:
+			bit_array[low] = True
+		return bit_array
+
+	def payload(self) -> bytes:
+		return _native_to_little(self.values)
+
+
+class _BitmapContainer:
+	"""A BitArray of all 65536 bits in a chunk, plus its popcount."""
+
+	KIND = 1
+
+	def __init__(self, bit_array: BitArray, cardinality: int) -> None:
+		self.bit_array = bit_array
+		self.cardinality = cardinality
+
+	def __len__(self) -> int:
+		return self.cardinality
+
+	def __contains__(self, low: int) -> bool:
+		return self.bit_array[low]
+
+	def __iter__(self) -> Iterator[int]:
+		return self.bit_array.iter_set()
+
+	@property
+	def nbytes(self) -> int:
+		return _CHUNK_BITS // 8
+
+	def add(self, low: int) -> "_Container":
+		if not self.bit_array[low]:
+			self.bit_array[low] = True
+			self.cardinality += 1
+		return self
+
+	def discard(self, low: int) -> "_Container":
+		if self.bit_array[low]:
+			self.bit_array[low] = False
+			self.cardinality -= 1
+			if self.cardinality <= _ARRAY_MAX:
+				return _ArrayContainer(array("H", self.bit_array.iter_set()))
+		return self
+
+	def copy(self) -> "_BitmapContainer":
+		return _BitmapContainer(self.to_bit_array(), self.cardinality)
+
+	def to_bit_array(self) -> BitArray:
+		bit_array = BitArray(_CHUNK_BITS)
+		bit_array |= self.bit_array
+		return bit_array
+
+	def payload(self) -> bytes:
+		return self.bit_array.to_bytes()
+
+
+class _RunContainer:
+	"""Sorted runs of consecutive set bits in a chunk. Run i covers the low
+	parts starts[i] up to and including starts[i] + lengths[i]. Run
+	containers are read-optimized: changing a bit first converts the container
+	to an array or bitmap container."""
+
+	KIND = 2
+
+	def __init__(self, starts: "array[int]", lengths: "array[int]") -> None:
+		self.starts = starts
+		self.lengths = lengths
+		self.cardinality = sum(lengths) + len(lengths)
+
+	def __len__(self) -> int:
+		return self.cardinality
+
+	def __contains__(self, low: int) -> bool:
+		i = bisect_right(self.starts, low) - 1
+		return i >= 0 and low <= self.starts[i] + self.lengths[i]
+
+	def __iter__(self) -> Iterator[int]:
+		for start, length in zip(self.starts, self.lengths):
+			yield from range(start, start + length + 1)
+
+	@property
+	def nbytes(self) -> int:
+		return 4 * len(self.starts)
+
+	def add(self, low: int) -> "_Container":
+		if low in self:
+			return self
+		return _container_from_bit_array(self.to_bit_array()).add(low)
+
+	def discard(self, low: int) -> "_Container":
+		if low not in self:
+			return self
+		return _container_from_bit_array(self.to_bit_array()).discard(low)
+
+	def copy(self) -> "_RunContainer":
+		return self   # run containers are never changed in place
+
+	def to_bit_array(self) -> BitArray:
+		bit_array = BitArray(_CHUNK_BITS)
+		for start, length in zip(self.starts, self.lengths):
+			bit_array.fill(start, start + length + 1)
+		return bit_array
+
+	def payload(self) -> bytes:
+		runs = array("H")
+		for start, length in zip(self.starts, self.lengths):
+			runs.extend((start, length))
+		return _native_to_little(runs)
+
+
+_Container: TypeAlias = _ArrayContainer | _BitmapContainer | _RunContainer
+
+
+def _container_from_bit_array(bit_array: BitArray) -> _Container:
+	"""Return an array or bitmap container (whichever is smaller) holding the
+	set bits of bit_array (a BitArray of 65536 bits)."""
+
+	if (cardinality := bit_array.count()) <= _ARRAY_MAX:
+		return _ArrayContainer(array("H", bit_array.iter_set()))
+	return _BitmapContainer(bit_array, cardinality)
+
+
+def _run_container(container: _Container) -> _RunContainer:
+	"""Return a run container with the same set bits as container."""
+
+	if isinstance(container, _RunContainer):
+		return container
+
+	bit_array = container.to_bit_array()
+	inverted = ~bit_array
+	starts, lengths = array("H"), array("H")
+	start = bit_array.find_next(0)
+	while start != -1:
+		if (stop := inverted.find_next(start)) == -1:
+			stop = _CHUNK_BITS
+		starts.append(start)
+		lengths.append(stop - start - 1)
+		start = bit_array.find_next(stop)
+	return _RunContainer(starts, lengths)
+
+
+class RoaringBitmap:
+	"""A compressed bitmap of nr_bits bits (by default 2^32), all initially 0.
+	Bits can be set and read using indexing, and len() returns nr_bits, as
+	for BitArray. The union (|) and intersection (&) of two RoaringBitmaps
+	are computed chunk by chunk, skipping chunks that have no set bits in
+	one (intersection) or both (union) operands."""
+
+	_HEADER = struct.Struct("<4sQI")
+	_CONTAINER_HEADER = struct.Struct("<HBI")
+	_MAGIC = b"RBM1"
+
+	def __init__(self, nr_bits: int = 1 << 32) -> None:
+		self.__nr_bits = nr_bits
+		self.__containers: dict[int, _Container] = {}
+
+	def __check_index(self, bit_nr: int) -> None:
+		if not 0 <= bit_nr < self.__nr_bits:
+			raise IndexError(f"bit {bit_nr} out of range for RoaringBitmap "
+			                 f"of length {self.__nr_bits}.")
+
+	def __getitem__(self, bit_nr: int) -> bool:
+		self.__check_index(bit_nr)
+		high, low = divmod(bit_nr, _CHUNK_BITS)
+		container = self.__containers.get(high)
+		return container is not None and low in container
+
+	def __setitem__(self, bit_nr: int, bit_value: bool) -> None:
+		self.__check_index(bit_nr)
+		high, low = divmod(bit_nr, _CHUNK_BITS)
+		container = self.__containers.get(high)
+		if bit_value:
+			if container is None:
+				self.__containers[high] = _ArrayContainer(array("H", (low,)))
+			else:
+				self.__containers[high] = container.add(low)
+		elif container is not None:
+			if len(container := container.discard(low)):
+				self.__containers[high] = container
+			else:
+				del self.__containers[high]
+
+	def __len__(self) -> int:
+		return self.__nr_bits
+
+	def __eq__(self, other: Any) -> bool:
+		if not isinstance(other, RoaringBitmap):
+			return NotImplemented
+		return (self.__nr_bits == other.__nr_bits
+		        and list(self.iter_set()) == list(other.iter_set()))
+
+	@property
+	def nbytes(self) -> int:
+		"""Return the nr of bytes used by the containers' payloads."""
+
+		return sum(container.nbytes
+		           for container in self.__containers.values())
+
+	def count(self) -> int:
+		"""Return the number of bits set to 1."""
+
+		return sum(len(container) for container in self.__containers.values())
+
+	def any(self) -> bool:
+		"""Return True if at least one bit is set, else False."""
+
+		return bool(self.__containers)
+
+	def iter_set(self) -> Iterator[int]:
+		"""Yield the indices of all set bits, in ascending order."""
+
+		for high in sorted(self.__containers):
+			base = high * _CHUNK_BITS
+			for low in self.__containers[high]:
+				yield base + low
+
+	def run_optimize(self) -> None:
+		"""Convert every container to a run container if that is smaller.
+		Worthwhile for bitmaps with long stretches of consecutive set bits
+		that will mostly be read from now on."""
+
+		for high, container in self.__containers.items():
+			run_container = _run_container(container)
+			if run_container.nbytes < container.nbytes:
+				self.__containers[high] = run_container
+
+	def __check_compatible(self, other: "RoaringBitmap") -> None:
+		if self.__nr_bits != other.__nr_bits:
+			raise ValueError(f"RoaringBitmaps of different lengths "
+			                 f"({self.__nr_bits} and {other.__nr_bits}).")
+
+	@staticmethod
+	def __union(container_1: _Container, container_2: _Container) \
+		-> _Container:
+		if (isinstance(container_1, _ArrayContainer)
+		        and isinstance(container_2, _ArrayContainer)
+		        and len(container_1) + len(container_2) <= _ARRAY_MAX):
+			return _ArrayContainer(
+				array("H", sorted(set(container_1.values)
+				                  | set(container_2.values))))
+		bit_array = container_1.to_bit_array()
+		bit_array |= container_2.to_bit_array()
+		return _container_from_bit_array(bit_array)
+
+	@staticmethod
+	def __intersection(container_1: _Container, container_2: _Container) \
+		-> _Container:
+		if isinstance(container_2, _ArrayContainer):
+			container_1, container_2 = container_2, container_1
+		if isinstance(container_1, _ArrayContainer):
+			return _ArrayContainer(array("H", (low for low in container_1
+			                                   if low in container_2)))
+		bit_array = container_1.to_bit_array()
+		bit_array &= container_2.to_bit_array()
+		return _container_from_bit_array(bit_array)
+
+	def __or__(self, other: Any) -> "RoaringBitmap":
+		if not isinstance(other, RoaringBitmap):
+			return NotImplemented
+		self.__check_compatible(other)
+		result = RoaringBitmap(self.__nr_bits)
+		for high in self.__containers.keys() | other.__containers.keys():
+			if high not in other.__containers:
+				result.__containers[high] = self.__containers[high].copy()
+			elif high not in self.__containers:
+				result.__containers[high] = other.__containers[high].copy()
+			else:
+				result.__containers[high] = \
+					self.__union(self.__containers[high],
+					             other.__containers[high])
+		return result
+
+	def __and__(self, other: Any) -> "RoaringBitmap":
+		if not isinstance(other, RoaringBitmap):
+			return NotImplemented
+		self.__check_compatible(other)
+		result = RoaringBitmap(self.__nr_bits)
+		for high in self.__containers.keys() & other.__containers.keys():
+			container = self.__intersection(self.__containers[high],
+			                                other.__containers[high])
+			if len(container):
+				result.__containers[high] = container
+		return result
+
+	def __ior__(self, other: Any) -> "RoaringBitmap":
+		if not isinstance(other, RoaringBitmap):
+			return NotImplemented
+		self.__containers = (self | other).__containers
+		return self
+
+	def __iand__(self, other: Any) -> "RoaringBitmap":
+		if not isinstance(other, RoaringBitmap):
+			return NotImplemented
+		self.__containers = (self & other).__containers
+		return self
+
+	def to_bytes(self) -> bytes:
+		"""Return a portable (little endian) serialization of the bitmap."""
+
+		parts = [self._HEADER.pack(self._MAGIC, self.__nr_bits,
+		                           len(self.__containers))]
+		for high in sorted(self.__containers):
+			container = self.__containers[high]
+			size = (len(container.starts)
+			        if isinstance(container, _RunContainer)
+			        else len(container))
+			parts.append(self._CONTAINER_HEADER.pack(high, container.KIND,
+			                                         size))
+			parts.append(container.payload())
+		return b"".join(parts)
+
+	@classmethod
+	def from_bytes(cls, data: bytes) -> "RoaringBitmap":
+		"""Return the RoaringBitmap serialized in data (by to_bytes)."""
+
+		magic, nr_bits, nr_containers = cls._HEADER.unpack_from(data)
+		if magic != cls._MAGIC:
+			raise ValueError("Not a serialized RoaringBitmap.")
+
+		bitmap = cls(nr_bits)
+		offset = cls._HEADER.size
+		for _ in range(nr_containers):
+			high, kind, size = cls._CONTAINER_HEADER.unpack_from(data, offset)
+			offset += cls._CONTAINER_HEADER.size
+			container: _Container
+			if kind == _ArrayContainer.KIND:
+				container = _ArrayContainer(
+					_little_to_native("H", data[offset:offset + 2 * size]))
+				offset += 2 * size
+			elif kind == _BitmapContainer.KIND:
+				container = _BitmapContainer(
+					BitArray.from_bytes(data[offset:offset + _CHUNK_BITS // 8]),
+					size)
+				offset += _CHUNK_BITS // 8
+			elif kind == _RunContainer.KIND:
+				runs = _little_to_native("H", data[offset:offset + 4 * size])
+				container = _RunContainer(runs[0::2], runs[1::2])
+				offset += 4 * size
+			else:
+				raise ValueError(f"Unknown container kind {kind}.")
+			bitmap.__containers[high] = container
+		return bitmap
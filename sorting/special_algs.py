@@ -3,6 +3,8 @@ import time
 from collections.abc import Iterable
 from random import sample
 
+from bitarray import iter_set_bits
+
 
 # Suppose you must sort and output a subset of unsorted integers in the range
 # [a, a + n] (a total of n + 1 integers) from a file, with
@@ -57,9 +59,7 @@ def bit_array_sort(start: int, stop: int, filename: str) -> Iterable[int]:
 				                 f"(must be in range({start}, {stop}))")
 			set_bit(bit_array, value - start)
 
-	yield from (bit_nr + start
-	            for bit_nr in range(stop - start)
-	            if test_bit(bit_array, bit_nr))
+	yield from (bit_nr + start for bit_nr in iter_set_bits(bit_array))
 
 
 if __name__ == "__main__":
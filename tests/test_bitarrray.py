@@ -1,8 +1,11 @@
 """Test of bitarray class."""
 
+from pathlib import Path
 from random import choice
 
-from bitarray import BitArray
+import pytest
+
+from bitarray import BitArray, MmapBitArray, RankSelect, NibbleArray
 
 
 def test_bit_array() -> None:
@@ -17,3 +20,227 @@ def test_bit_array() -> None:
 
 
 test_bit_array()
+
+
+def _random_bit_array(nr_bits: int) -> tuple[BitArray, list[bool]]:
+	"""Return a BitArray with random bits set, and a list with the same
+	bits."""
+
+	bits = [choice((False, True)) for _ in range(nr_bits)]
+	ba = BitArray(nr_bits)
+	for i, bit in enumerate(bits):
+		ba[i] = bit
+	return ba, bits
+
+
+def test_bulk_operations() -> None:
+	for nr_bits in (0, 1, 7, 8, 9, 12345):
+		ba_1, bits_1 = _random_bit_array(nr_bits)
+		ba_2, bits_2 = _random_bit_array(nr_bits)
+		
+		for result, expected in (
+				(ba_1 & ba_2, map(bool.__and__, bits_1, bits_2)),
+				(ba_1 | ba_2, map(bool.__or__, bits_1, bits_2)),
+				(ba_1 ^ ba_2, map(bool.__xor__, bits_1, bits_2)),
+				(~ba_1, (not bit for bit in bits_1))):
+			assert [result[i] for i in range(nr_bits)] == list(expected)
+		
+		assert ba_1.count() == sum(bits_1)
+		assert (~ba_1).count() == nr_bits - sum(bits_1)
+		assert ba_1.any() == any(bits_1)
+		assert ba_1.all() == all(bits_1)
+		assert (ba_1 | ~ba_1).all()
+		assert not (ba_1 & ~ba_1).any()
+		
+		ba_3, _ = _random_bit_array(nr_bits)
+		ba_3 ^= ba_3
+		assert not ba_3.any()
+		ba_3 |= ba_1
+		assert ba_3 == ba_1
+		ba_3 &= ba_2
+		assert ba_3 == ba_1 & ba_2
+
+
+def test_fill() -> None:
+	nr_bits = 100
+	for (start, stop) in ((0, 0), (0, 100), (3, 5), (3, 17), (8, 64), (9, 99)):
+		for value in (False, True):
+			ba, bits = _random_bit_array(nr_bits)
+			ba.fill(start, stop, value)
+			bits[start:stop] = [value] * (stop - start)
+			assert [ba[i] for i in range(nr_bits)] == bits
+
+
+def test_mmap_bit_array(tmp_path: Path) -> None:
+	filename = tmp_path / "bits.bin"
+	nr_bits = 12345
+	ba, bits = _random_bit_array(nr_bits)
+	
+	with MmapBitArray(filename, nr_bits, mode="w+") as mba:
+		assert len(mba) == nr_bits
+		assert not mba.any()
+		mba |= ba
+		assert mba == ba
+	assert mba.closed
+	assert filename.stat().st_size == (nr_bits + 7) // 8
+	
+	with MmapBitArray(filename, nr_bits, mode="r+") as mba:
+		assert [mba[i] for i in range(nr_bits)] == bits
+		mba[0] = not bits[0]
+		mba.flush()
+		with MmapBitArray(filename, nr_bits) as read_only:
+			assert read_only[0] != bits[0]
+			assert read_only.count() == mba.count()
+			with pytest.raises(TypeError):
+				read_only[0] = bits[0]
+	
+	with MmapBitArray(filename) as mba:
+		assert len(mba) == 8 * ((nr_bits + 7) // 8)
+	
+	with pytest.raises(ValueError):
+		MmapBitArray(filename, nr_bits + 8)
+	with pytest.raises(ValueError):
+		MmapBitArray(filename, mode="w+")
+	
+	# Closing fails (and leaves it usable) while a view is in use.
+	mba = MmapBitArray(filename)
+	view = mba.view()
+	with pytest.raises(BufferError):
+		mba.close()
+	assert not mba.closed and mba.count() == ba.count() + 1 - 2 * bits[0]
+	view.release()
+	mba.close()
+	assert mba.closed
+	
+	with MmapBitArray(filename, 0, mode="w+") as mba:
+		assert len(mba) == 0 and not mba.any()
+	assert filename.stat().st_size == 0
+	with MmapBitArray(filename) as mba:
+		assert len(mba) == 0
+
+
+def test_iter_set_and_find() -> None:
+	nr_bits = 12345
+	ba = BitArray(nr_bits)
+	set_bits = [0, 1, 9, 63, 64, 65, 800, 801, 5000, nr_bits - 1]
+	for bit_nr in set_bits:
+		ba[bit_nr] = True
+	
+	assert list(ba.iter_set()) == set_bits
+	assert list(BitArray(nr_bits).iter_set()) == []
+	
+	for offset in range(-1, nr_bits + 1):
+		expected_next = min((b for b in set_bits if b >= offset), default=-1)
+		expected_prev = max((b for b in set_bits if b <= offset), default=-1)
+		assert ba.find_next(offset) == expected_next
+		assert ba.find_prev(offset) == expected_prev
+	
+	ba, bits = _random_bit_array(nr_bits)
+	assert list(ba.iter_set()) == [i for i, bit in enumerate(bits) if bit]
+
+
+def test_slicing() -> None:
+	nr_bits = 200
+	ba, bits = _random_bit_array(nr_bits)
+	slices = (slice(None), slice(3, 150), slice(8, 16), slice(5, 5),
+	          slice(7, 190, 3), slice(None, None, -1), slice(-20, None),
+	          slice(30, 22))
+	for s in slices:
+		assert [ba[s][i] for i in range(len(ba[s]))] == bits[s]
+	
+	for s in slices:
+		for value in (False, True, 0, 1):
+			ba, bits = _random_bit_array(nr_bits)
+			ba[s] = value
+			bits[s] = [bool(value)] * len(bits[s])
+			assert [ba[i] for i in range(nr_bits)] == bits
+		
+		ba, bits = _random_bit_array(nr_bits)
+		other, other_bits = _random_bit_array(len(bits[s]))
+		ba[s] = other
+		bits[s] = other_bits
+		assert [ba[i] for i in range(nr_bits)] == bits
+		assert ba[s] == other
+		
+		ba[s] = [not bit for bit in other_bits]
+		assert ba[s] == ~other
+	
+	with pytest.raises(ValueError):
+		ba[0:10] = BitArray(9)
+
+
+def test_rank_select() -> None:
+	nr_bits = 3 * RankSelect.BLOCK_SIZE + 123
+	ba, bits = _random_bit_array(nr_bits)
+	rs = RankSelect(ba)
+	
+	def check() -> None:
+		set_bits = [i for i, bit in enumerate(bits) if bit]
+		assert rs.count() == len(set_bits)
+		for i in range(0, nr_bits + 1, 7):
+			assert rs.rank(i) == sum(bits[:i])
+		for k, bit_nr in enumerate(set_bits):
+			assert rs.select(k) == bit_nr
+		with pytest.raises(IndexError):
+			rs.select(len(set_bits))
+	
+	check()
+	
+	start, stop = RankSelect.BLOCK_SIZE - 5, RankSelect.BLOCK_SIZE + 100
+	for value in (True, False):
+		ba.fill(start, stop, value)
+		bits[start:stop] = [value] * (stop - start)
+		rs.rebuild(start, stop)
+		check()
+
+
+def test_bytes_import_export() -> None:
+	nr_bits = 1001
+	ba, bits = _random_bit_array(nr_bits)
+	
+	data = ba.to_bytes()
+	assert len(data) == (nr_bits + 7) // 8
+	assert bytes(ba) == data == bytes(ba.view())
+	assert BitArray.from_bytes(data, nr_bits) == ba
+	assert len(BitArray.from_bytes(data)) == 8 * len(data)
+	# bits beyond nr_bits are ignored when copying
+	assert BitArray.from_bytes(b"\xff\xff", 9).count() == 9
+	with pytest.raises(ValueError):
+		BitArray.from_bytes(data, nr_bits + 8)
+	
+	# frombuffer shares memory with the buffer
+	buffer = bytearray(data)
+	shared = BitArray.frombuffer(buffer, nr_bits)
+	assert shared == ba
+	shared[0] = not bits[0]
+	assert buffer[0] & 1 == (not bits[0])
+	buffer[1] = 0
+	assert not shared[8:16].any()
+	ba.view()[1] = 0
+	assert shared[0] != ba[0] and shared[1:] == ba[1:]
+	
+	read_only = BitArray.frombuffer(data, nr_bits)
+	assert read_only == BitArray.from_bytes(data, nr_bits)
+	with pytest.raises(TypeError):
+		read_only[0] = True
+
+
+def test_nibble_array() -> None:
+	size = 1001
+	na = NibbleArray(size)
+	assert len(na) == size
+	assert na.nbytes == (size + 1) // 2
+	values = [choice(range(16)) for _ in range(size)]
+	for i, value in enumerate(values):
+		na[i] = value
+	assert [na[i] for i in range(size)] == values
+	assert na.count_nonzero() == size - values.count(0)
+	with pytest.raises(ValueError):
+		na[0] = 16
+	
+	copy = NibbleArray.from_bytes(na.view(), size)
+	assert [copy[i] for i in range(size)] == values
+	copy = NibbleArray.from_bytes(b"\xff" * 3, 5)
+	assert copy.count_nonzero() == 5
+	with pytest.raises(ValueError):
+		NibbleArray.from_bytes(na.view()[:-1], size)
@@ -1,8 +1,16 @@
 """Test BloomFilter and CountingBloomFilter classes."""
-from random import choice
+from hashlib import sha256
+from pathlib import Path
+from collections import Counter
+from random import choice, randrange
+
+import pytest
 
 from _common_funcs import create_random_strings
-from bloomfilter import BloomFilter, CountingBloomFilter
+from bloomfilter import BloomFilter, CountingBloomFilter, HASH_SCHEMES, \
+	ScalableBloomFilter, build_parallel, BlockedBloomFilter, BLOCK_SIZE, \
+	CuckooFilter, BloomFilterStats, PreparedItem, prepare, \
+	CountMinSketch, HyperLogLog
 
 
 def test_bloom_filter() -> None:
@@ -46,3 +54,418 @@ def test_counting_bloom_filter() -> None:
 	#       f"queryed added strings: all found, "
 	#       f"deleted added strings: all deleted, queried deleted: none found, "
 	#       f"querying {nr_strings - add_count} other strings: none found: OK.")
+
+
+def test_hash_schemes() -> None:
+	nr_strings = 500
+	strings = create_random_strings(nr_strings, min_length=10)
+	for hash_scheme in HASH_SCHEMES:
+		bf = BloomFilter(10 ** -6, nr_strings, hash_scheme)
+		for s in strings[:nr_strings // 2]:
+			bf.add(s)
+		assert all(bf.query(s) for s in strings[:nr_strings // 2])
+		assert sum(bf.query(s) for s in strings[nr_strings // 2:]) <= 1
+	
+	# The "sha256" scheme is the original one.
+	bf = BloomFilter(10 ** -6, nr_strings, "sha256")
+	item = (1, "one")
+	assert bf._indices(item) \
+	       == [int(sha256(str((item, i)).encode("utf-8")).hexdigest(), 16)
+	           % bf._size
+	           for i in range(bf._nr_hash)]
+
+
+def test_batch_operations() -> None:
+	nr_strings = 2000
+	strings = create_random_strings(nr_strings, min_length=10)
+	added, not_added = strings[:nr_strings // 2], strings[nr_strings // 2:]
+	
+	for bf in (BloomFilter(10 ** -10, nr_strings),
+	           CountingBloomFilter(10 ** -10, nr_strings, 'B')):
+		bf.add_many(added)
+		assert all(bf.query(s) for s in added)
+		assert bf.query_many(added) == [True] * len(added)
+		assert bf.query_many(not_added) == [bf.query(s) for s in not_added]
+		assert not any(bf.query_many(not_added))
+	
+	bf = BloomFilter(10 ** -10, nr_strings)
+	for s in added:
+		bf.add(s)
+	bf_many = BloomFilter(10 ** -10, nr_strings)
+	bf_many.add_many(added)
+	assert bf_many._bit_array == bf._bit_array
+
+
+def test_save_and_load(tmp_path: Path) -> None:
+	filename = tmp_path / "filter.blm"
+	nr_strings = 1000
+	strings = create_random_strings(nr_strings, min_length=10)
+	added, not_added = strings[:nr_strings // 2], strings[nr_strings // 2:]
+	
+	for hash_scheme in HASH_SCHEMES:
+		bf = BloomFilter(10 ** -8, nr_strings, hash_scheme)
+		bf.add_many(added)
+		bf.save(filename)
+		
+		for mmap in (False, True):
+			loaded = BloomFilter.load(filename, mmap=mmap)
+			assert str(loaded) == str(bf)
+			assert loaded._bit_array == bf._bit_array
+			assert all(loaded.query_many(added))
+			assert loaded.query_many(not_added) == bf.query_many(not_added)
+			loaded.close()
+	
+	loaded = BloomFilter.load(filename, writable=True)
+	loaded.add_many(not_added)
+	loaded.close()
+	loaded = BloomFilter.load(filename)
+	assert all(loaded.query_many(strings))
+	with pytest.raises(TypeError):
+		loaded.add(strings[0])
+	loaded.close()
+	
+	
+	for counter_type in (CountingBloomFilter.NIBBLE_COUNTERS, "B", "H"):
+		cbf = CountingBloomFilter(10 ** -3, nr_strings, counter_type)
+		cbf.add_many(added)
+		cbf.add_many(added[:10])
+		cbf.save(filename)
+		with pytest.raises(ValueError):
+			BloomFilter.load(filename)
+		loaded = CountingBloomFilter.load(filename)
+		assert str(loaded) == str(cbf)
+		assert loaded.stats()[:4] == cbf.stats()[:4]
+		assert loaded.delete_many(added[:10]) == [True] * 10
+		assert all(loaded.query_many(added))
+		assert loaded.delete_many(added) == [True] * len(added)
+		assert loaded.stats().bits_set == 0
+	
+	bf.save(filename)
+	with pytest.raises(ValueError):
+		CountingBloomFilter.load(filename)
+	data = filename.read_bytes()
+	filename.write_bytes(data.replace(bf._hash_scheme.encode(), b"md5", 1))
+	with pytest.raises(ValueError):
+		BloomFilter.load(filename)
+	filename.write_bytes(b"not a bloom filter")
+	with pytest.raises(ValueError):
+		BloomFilter.load(filename)
+
+
+def test_scalable_bloom_filter() -> None:
+	nr_strings = 4000
+	strings = create_random_strings(nr_strings, min_length=10)
+	added, not_added = strings[:nr_strings // 2], strings[nr_strings // 2:]
+	
+	fpr = 0.01
+	sbf = ScalableBloomFilter(fpr, 100)
+	sbf.add_many(added)
+	assert sbf.nr_filters > 1
+	assert all(sbf.query_many(added))
+	# On average fpr * len(not_added) = 20 false positives.
+	assert sum(sbf.query_many(not_added)) < 3 * fpr * len(not_added)
+
+
+def test_union_and_intersection() -> None:
+	nr_strings = 1000
+	strings = create_random_strings(nr_strings, min_length=10)
+	bf_1, bf_2 = BloomFilter(10 ** -6, nr_strings), \
+	             BloomFilter(10 ** -6, nr_strings)
+	bf_1.add_many(strings[:600])
+	bf_2.add_many(strings[400:])
+	
+	union = bf_1.union(bf_2)
+	assert all(union.query_many(strings))
+	intersection = bf_1.intersection(bf_2)
+	assert all(intersection.query_many(strings[400:600]))
+	assert sum(intersection.query_many(strings[:400] + strings[600:])) <= 2
+	
+	with pytest.raises(ValueError):
+		bf_1.union(BloomFilter(10 ** -6, nr_strings, "sha256"))
+	
+	cbf_1, cbf_2 = CountingBloomFilter(10 ** -6, nr_strings), \
+	               CountingBloomFilter(10 ** -6, nr_strings, "B")
+	cbf_1.add_many(strings[:600])
+	cbf_2.add_many(strings[400:])
+	assert bf_1.union(cbf_2)._bit_array == union._bit_array
+	assert cbf_1.intersection(bf_2)._bit_array == intersection._bit_array
+	
+	counting_union = cbf_1.union(cbf_2)
+	assert isinstance(counting_union, CountingBloomFilter)
+	assert counting_union._bits() == union._bit_array
+	assert all(counting_union.delete_many(strings[:600]))
+	assert all(counting_union.query_many(strings[400:]))
+	assert all(counting_union.delete_many(strings[400:]))
+	assert counting_union.stats().bits_set == 0
+	
+	counting_intersection = cbf_1.intersection(cbf_2)
+	assert isinstance(counting_intersection, CountingBloomFilter)
+	assert counting_intersection._bits() == intersection._bit_array
+	assert all(counting_intersection.delete_many(strings[400:600]))
+	
+	# A saturated counter does not survive an intersection with a zero one,
+	# but it does with another saturated one, and it saturates a union.
+	saturated, empty = CountingBloomFilter(10 ** -6, nr_strings), \
+	                   CountingBloomFilter(10 ** -6, nr_strings, "B")
+	for _ in range(20):
+		saturated.add("x")
+	assert not saturated.intersection(empty).query("x")
+	assert not empty.intersection(saturated).query("x")
+	both = saturated.intersection(saturated)
+	assert both.delete("x") and both.query("x")
+	union = saturated.union(empty)
+	assert union.delete("x") and union.query("x")
+
+
+def test_build_parallel() -> None:
+	nr_strings = 5000
+	strings = create_random_strings(nr_strings, min_length=10)
+	
+	bf = BloomFilter(10 ** -6, nr_strings)
+	bf.add_many(strings)
+	parallel_bf = build_parallel(strings, 10 ** -6, nr_strings,
+	                             processes=3, batch_size=400)
+	assert parallel_bf._bit_array == bf._bit_array
+
+
+def test_blocked_bloom_filter(tmp_path: Path) -> None:
+	nr_strings = 4000
+	strings = create_random_strings(nr_strings, min_length=10)
+	added, not_added = strings[:nr_strings // 2], strings[nr_strings // 2:]
+	
+	fpr = 0.01
+	bbf = BlockedBloomFilter(fpr, len(added))
+	assert len(bbf._bit_array) % BLOCK_SIZE == 0
+	for s in added[:100]:
+		bbf.add(s)
+		indices = bbf._indices(s)
+		assert len({i // BLOCK_SIZE for i in indices}) == 1
+	bbf.add_many(added[100:])
+	assert all(bbf.query(s) for s in added)
+	assert bbf.query_many(not_added) == [bf_query for bf_query in
+	                                     map(bbf.query, not_added)]
+	# Blocking makes the false positive rate somewhat higher.
+	assert sum(bbf.query_many(not_added)) < 3 * fpr * len(not_added)
+	
+	filename = tmp_path / "blocked.blm"
+	bbf.save(filename)
+	loaded = BloomFilter.load(filename, mmap=False)
+	assert loaded.query_many(strings) == bbf.query_many(strings)
+	assert bbf.union(loaded).query_many(strings) == bbf.query_many(strings)
+
+
+def test_counting_bloom_filter_counters() -> None:
+	nr_strings = 2000
+	strings = create_random_strings(nr_strings, min_length=10)
+	added, not_added = strings[:nr_strings // 2], strings[nr_strings // 2:]
+	
+	for counter_type in (CountingBloomFilter.NIBBLE_COUNTERS, 'B', 'h'):
+		bf = CountingBloomFilter(10 ** -6, nr_strings, counter_type)
+		bf.add_many(added)
+		assert all(bf.query_many(added))
+		assert bf.delete_many(added[:100] + not_added[:100]) \
+		       == [True] * 100 + [False] * 100
+		assert not any(bf.query_many(added[:100]))
+		assert all(bf.query_many(added[100:]))
+	
+	# Saturated counters are sticky: adding an item more often than the
+	# maximum counter value and then deleting it does not lose it.
+	bf = CountingBloomFilter(10 ** -6, nr_strings)
+	item = strings[0]
+	for _ in range(20):
+		bf.add(item)
+	assert all(bf.increment_counter(i) == 15 for i in bf._indices(item))
+	for _ in range(20):
+		assert bf.delete(item)
+	assert bf.query(item)
+
+
+def test_cuckoo_filter() -> None:
+	nr_strings = 4000
+	strings = create_random_strings(nr_strings, min_length=10)
+	added, not_added = strings[:nr_strings // 2], strings[nr_strings // 2:]
+	
+	cf = CuckooFilter(len(added))
+	cf.add_many(added)
+	assert len(cf) == len(added)
+	assert all(cf.query_many(added))
+	assert sum(cf.query_many(not_added)) \
+	       <= 3 * cf.false_positive_rate * len(not_added)
+	
+	assert all(cf.delete_many(added[:500]))
+	assert len(cf) == len(added) - 500
+	assert all(cf.query_many(added[500:]))
+	assert sum(cf.query_many(added[:500])) <= 3
+	
+	# Fill a small filter until it is full: no added item is ever lost.
+	cf = CuckooFilter(100, fingerprint_bits=16, bucket_size=2)
+	added_items = []
+	with pytest.raises(OverflowError):
+		for s in strings:
+			cf.add(s)
+			added_items.append(s)
+	assert len(added_items) >= 100
+	assert all(cf.query_many(added_items))
+	assert all(cf.delete_many(added_items))
+	assert len(cf) == 0
+	cf.add(strings[0])
+	assert cf.query(strings[0])
+
+
+def test_double_hashing_does_not_degenerate() -> None:
+	# With plain double hashing, items for which h2 happens to be a multiple
+	# of size / 2 got only one or two distinct indices.
+	nr_strings = 2000
+	strings = create_random_strings(nr_strings, min_length=10)
+	bf = BloomFilter(10 ** -10, nr_strings)
+	assert min(len(set(bf._indices(s))) for s in strings) > bf._nr_hash // 2
+
+
+def test_stats() -> None:
+	nr_strings = 2000
+	strings = create_random_strings(nr_strings, min_length=10)
+	
+	for bf in (BloomFilter(10 ** -3, nr_strings),
+	           CountingBloomFilter(10 ** -3, nr_strings)):
+		stats = bf.stats()
+		assert isinstance(stats, BloomFilterStats)
+		assert stats.bits_set == stats.nr_adds == stats.nr_queries == 0
+		
+		bf.add_many(s for s in strings[:1000])
+		for s in strings[1000:1500]:
+			bf.add(s)
+		bf.query_many(strings[:100])
+		bf.query(strings[0])
+		
+		stats = bf.stats()
+		assert stats.nr_adds == 1500
+		assert stats.nr_queries == 101
+		assert stats.nr_hashed == 1601
+		assert 0 < stats.bits_set <= 1500 * stats.nr_hash
+		assert stats.fill_ratio == stats.bits_set / stats.size
+		assert abs(stats.estimated_nr_items - 1500) < 100
+		assert stats.estimated_false_positive_rate < 10 ** -3
+		
+		bf.add_many(strings[1500:])
+		assert abs(bf.stats().fill_ratio - 0.5) < 0.05
+
+
+def test_bytes_keys_and_prepared_items() -> None:
+	keys = [s.encode("utf-8")
+	        for s in create_random_strings(1000, min_length=10)]
+	
+	for hash_scheme in HASH_SCHEMES:
+		bf = BloomFilter(10 ** -3, 1000, hash_scheme)
+		bf.add_many(keys[:500])
+		# bytes, bytearray and memoryview keys with equal contents are equal.
+		assert all(bf.query(bytearray(key)) for key in keys[:500])
+		assert all(bf.query(memoryview(key)) for key in keys[:500])
+		assert bf.query_many(map(prepare, keys[:500])) == [True] * 500
+		assert sum(bf.query_many(keys[500:])) < 10
+	
+	# A str item is hashed as its UTF-8 encoding.
+	bf = BloomFilter(10 ** -3, 1000)
+	bf.add("spam")
+	assert bf.query(b"spam")
+	# Other items are tagged with their type, so they don't collide.
+	bf.add_many([1, (1, "a")])
+	assert bf.query(1) and bf.query((1, "a"))
+	assert prepare(1).encoded != prepare("1").encoded == prepare(b"1").encoded
+	assert prepare((1, "a")).encoded != prepare("(1, 'a')").encoded
+	
+	filters = [BloomFilter(10 ** -3, 1000), BlockedBloomFilter(10 ** -3, 1000),
+	           CountingBloomFilter(10 ** -3, 1000), CuckooFilter(1000),
+	           ScalableBloomFilter(10 ** -3, 100),
+	           BloomFilter(10 ** -3, 1000, "sha256")]
+	prepared = [prepare(key) for key in keys[:500]]
+	assert prepare(prepared[0]) is prepared[0]
+	assert isinstance(prepared[0], PreparedItem)
+	for bf in filters:
+		bf.add_many(prepared)
+		assert all(bf.query(key) for key in keys[:500])
+		assert all(bf.query(item) for item in prepared)
+	
+	counting, cuckoo = filters[2:4]
+	assert all(counting.delete(key) for key in keys[:500])
+	assert all(cuckoo.delete(prepare(key)) for key in keys[:500])
+	assert len(cuckoo) == 0
+
+
+def test_count_min_sketch() -> None:
+	cms = CountMinSketch(0.001, 0.01)
+	assert cms.width == 2719 and cms.depth == 5
+	with pytest.raises(ValueError):
+		CountMinSketch(0, 0.01)
+	with pytest.raises(ValueError):
+		CountMinSketch(0.001, 1)
+	with pytest.raises(ValueError):
+		cms.add("spam", -1)
+	
+	strings = create_random_strings(2000, min_length=10)
+	items = [strings[min(randrange(2000), randrange(2000))]
+	         for _ in range(20_000)]
+	counts = Counter(items)
+	conservative = CountMinSketch(0.001, 0.01, conservative=True)
+	cms.add_many(items[:10_000])
+	cms.add_counts(Counter(items[10_000:]).items())
+	for item in items:
+		conservative.add(item)
+	assert cms.total == conservative.total == 20_000
+	
+	max_error = 0.001 * 20_000
+	estimates = cms.estimate_many(strings)
+	for s, estimate in zip(strings, estimates):
+		assert counts[s] <= conservative.estimate(s) <= estimate
+	assert sum(estimate - counts[s] > max_error
+	           for s, estimate in zip(strings, estimates)) < 0.01 * 2000
+	
+	first, second = CountMinSketch(0.001, 0.01), CountMinSketch(0.001, 0.01)
+	first.add_many(items[:10_000])
+	second.add_many(items[10_000:])
+	merged = first.merge(second)
+	assert merged.estimate_many(strings) == estimates
+	first.update(second)
+	assert first.estimate_many(strings) == estimates
+	assert first.total == 20_000
+	with pytest.raises(ValueError):
+		first.merge(CountMinSketch(0.01, 0.01))
+
+
+def test_hyperloglog() -> None:
+	with pytest.raises(ValueError):
+		HyperLogLog(3)
+	
+	strings = create_random_strings(20_000, min_length=10)
+	hll = HyperLogLog()
+	assert hll.cardinality() == 0
+	hll.add_many(strings[:100] * 3)
+	assert hll.is_sparse
+	assert abs(hll.cardinality() - 100) <= 5
+	assert HyperLogLog.from_bytes(hll.to_bytes()) == hll
+	
+	hll.add_many(strings[100:10_000])
+	assert not hll.is_sparse
+	assert abs(hll.cardinality() - 10_000) < 4 * hll.relative_error * 10_000
+	assert HyperLogLog.from_bytes(hll.to_bytes()) == hll
+	
+	other = HyperLogLog()
+	other.add_many(strings[5000:])
+	merged = hll.merge(other)
+	assert abs(merged.cardinality() - 20_000) \
+		< 4 * merged.relative_error * 20_000
+	everything = HyperLogLog()
+	everything.add_many(strings)
+	assert merged == everything
+	
+	# Merging sparse estimators stays sparse.
+	first, second = HyperLogLog(), HyperLogLog()
+	first.add_many(strings[:50])
+	second.add_many(strings[25:100])
+	merged = first.merge(second)
+	assert merged.is_sparse
+	assert abs(merged.cardinality() - 100) <= 5
+	
+	with pytest.raises(ValueError):
+		hll.merge(HyperLogLog(10))
+	with pytest.raises(ValueError):
+		HyperLogLog.from_bytes(hll.to_bytes()[:-1])
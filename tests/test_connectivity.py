@@ -0,0 +1,253 @@
+"""Test of UnionFind and CSRGraph classes, and the edge list ingest."""
+from array import array
+from itertools import pairwise
+from pathlib import Path
+from random import randrange
+
+import pytest
+
+from connectivity import CSRGraph, IngestStats, UnionFind, check_connection, \
+	ingest_edges, iter_edge_chunks, ingest_edges_parallel, \
+	partition_edge_file
+
+
+def _random_edges(nr_nodes: int, nr_edges: int) -> list[tuple[int, int]]:
+	return [(randrange(nr_nodes), randrange(nr_nodes))
+	        for _ in range(nr_edges)]
+
+
+def _components(nr_nodes: int, edges: list[tuple[int, int]]) \
+	-> list[set[int]]:
+	"""Return the components of the graph, by depth-first search."""
+
+	neighbours: list[list[int]] = [[] for _ in range(nr_nodes)]
+	for p, q in edges:
+		neighbours[p].append(q)
+		neighbours[q].append(p)
+	seen: set[int] = set()
+	components = []
+	for start in range(nr_nodes):
+		if start in seen:
+			continue
+		component, stack = {start}, [start]
+		while stack:
+			for node in neighbours[stack.pop()]:
+				if node not in component:
+					component.add(node)
+					stack.append(node)
+		seen |= component
+		components.append(component)
+	return components
+
+
+def test_union_find() -> None:
+	nr_nodes = 2000
+	edges = _random_edges(nr_nodes, 1000)
+	union_find = UnionFind(nr_nodes)
+	for p, q in edges:
+		connected = union_find.connected(p, q)
+		assert union_find.union(p, q) is not connected
+		assert union_find.connected(p, q)
+
+	components = _components(nr_nodes, edges)
+	assert union_find.nr_components == len(components)
+	for component in components:
+		roots = {union_find.find(node) for node in component}
+		assert len(roots) == 1
+		assert union_find.component_size(roots.pop()) == len(component)
+	assert sorted(map(sorted, union_find.components().values())) \
+		== sorted(map(sorted, components))
+
+	with pytest.raises(IndexError):
+		union_find.find(nr_nodes)
+	with pytest.raises(IndexError):
+		union_find.union(-1, 0)
+
+
+def test_largest_component_and_union_pairs() -> None:
+	nr_nodes = 500
+	edges = _random_edges(nr_nodes, 300)
+	union_find = UnionFind(nr_nodes)
+	assert union_find.largest_component_size == 1
+	nr_merged = union_find.union_pairs(node for edge in edges for node in edge)
+	components = _components(nr_nodes, edges)
+	assert nr_merged == nr_nodes - len(components)
+	assert union_find.largest_component_size == max(map(len, components))
+
+
+def test_root_pairs() -> None:
+	nr_nodes = 500
+	edges = _random_edges(nr_nodes, 300)
+	union_find = UnionFind(nr_nodes)
+	for p, q in edges:
+		union_find.union(p, q)
+	root_pairs = union_find.root_pairs()
+	assert len(root_pairs) == 2 * (nr_nodes - union_find.nr_components)
+	replayed = UnionFind(nr_nodes)
+	replayed.union_pairs(root_pairs)
+	assert sorted(replayed.components().values()) \
+		== sorted(union_find.components().values())
+
+
+def test_union_find_grow() -> None:
+	union_find = UnionFind()
+	assert len(union_find) == union_find.nr_components == 0
+	union_find.grow(10)
+	union_find.union(0, 9)
+	union_find.grow(5)
+	assert len(union_find) == 10
+	assert union_find.nr_components == 9
+	union_find.grow(20)
+	assert union_find.nr_components == 19
+	assert union_find.connected(9, 0)
+	assert union_find.component_size(19) == 1
+
+
+def test_check_connection() -> None:
+	union_find = UnionFind()
+	assert not check_connection((1, 4), union_find)
+	assert not check_connection((1, 3), union_find)
+	assert check_connection((3, 4), union_find)
+	assert check_connection((4, 1), union_find)
+	assert not check_connection((5, 4), union_find)
+	assert union_find.component_size(1) == 4
+
+
+def test_ingest_edges(tmp_path: Path) -> None:
+	nr_nodes = 3000
+	edges = _random_edges(nr_nodes, 2000)
+	components = _components(nr_nodes, edges)
+	text_file = tmp_path / "edges.txt"
+	text_file.write_text("# p q\n" + "".join(f"{p}\t{q}\n" for p, q in edges)
+	                     + "# the end")
+	binary_file = tmp_path / "edges.bin"
+	binary_file.write_bytes(array("I", [node for edge in edges
+	                                    for node in edge]).tobytes())
+	
+	def check(union_find: UnionFind, stats: IngestStats) -> None:
+		assert stats.nr_edges == len(edges)
+		assert stats.nr_nodes == max(max(edge) for edge in edges) + 1
+		assert stats.nr_components \
+			== len(components) - (nr_nodes - stats.nr_nodes)
+		assert stats.largest_component_size == max(map(len, components))
+		for p, q in edges[:100]:
+			assert union_find.connected(p, q)
+	
+	progress: list[IngestStats] = []
+	check(*ingest_edges(text_file, chunk_size=1000, progress=progress.append))
+	assert len(progress) > 10
+	assert [stats.nr_edges for stats in progress] \
+		== sorted(stats.nr_edges for stats in progress)
+	check(*ingest_edges(text_file, use_mmap=True, chunk_size=999))
+	check(*ingest_edges(binary_file, binary=True, chunk_size=1001))
+	check(*ingest_edges(binary_file, binary=True, use_mmap=True))
+	with binary_file.open("rb") as file:
+		check(*ingest_edges(file, binary=True, chunk_size=64))
+	
+	assert sum(map(len, iter_edge_chunks(binary_file, binary=True,
+	                                     chunk_size=100))) == 2 * len(edges)
+	(tmp_path / "empty").write_bytes(b"")
+	assert list(iter_edge_chunks(tmp_path / "empty", use_mmap=True)) == []
+	binary_file.write_bytes(binary_file.read_bytes()[:-1])
+	with pytest.raises(ValueError):
+		ingest_edges(binary_file, binary=True)
+	text_file.write_text("1 2\n3\n")
+	with pytest.raises(ValueError):
+		ingest_edges(text_file)
+
+
+def test_ingest_edges_parallel(tmp_path: Path) -> None:
+	edges = _random_edges(5000, 4000) + [(5000, 5000)]
+	text_file = tmp_path / "edges.txt"
+	text_file.write_text("".join(f"{p} {q}\n" for p, q in edges))
+	binary_file = tmp_path / "edges.bin"
+	binary_file.write_bytes(array("Q", [node for edge in edges
+	                                    for node in edge]).tobytes())
+	
+	for nr_parts in (1, 3, 7):
+		parts = partition_edge_file(text_file, nr_parts)
+		assert len(parts) == nr_parts
+		assert parts[0][0] == 0 and parts[-1][1] == text_file.stat().st_size
+		assert sum(len(chunk) for start, stop in parts
+		           for chunk in iter_edge_chunks(text_file, start=start,
+		                                         stop=stop)) == 2 * len(edges)
+		parts = partition_edge_file(binary_file, nr_parts, True, "Q")
+		assert all(start % 16 == 0 for start, _ in parts)
+	
+	serial, serial_stats = ingest_edges(text_file)
+	components = sorted(serial.components().values())
+	for source, binary, typecode in ((text_file, False, "I"),
+	                                 (binary_file, True, "Q")):
+		for use_mmap in (False, True):
+			union_find, stats = ingest_edges_parallel(
+				source, binary, typecode, chunk_size=1000, use_mmap=use_mmap,
+				processes=3)
+			assert sorted(union_find.components().values()) == components
+			assert stats[:4] == serial_stats[:4]
+
+
+def _check_path(graph: CSRGraph, path: list[int], length: int) -> None:
+	assert len(path) == length + 1
+	for p, q in pairwise(path):
+		assert q in graph.neighbours(p)
+
+
+def test_csr_graph(tmp_path: Path) -> None:
+	nr_nodes = 1000
+	edges = _random_edges(nr_nodes, 800)
+	graph = CSRGraph.from_edges(edges, nr_nodes + 5)
+	assert len(graph) == nr_nodes + 5 and graph.nr_edges == len(edges)
+	assert graph.degree(nr_nodes) == 0
+	for node in range(nr_nodes):
+		assert sorted(graph.neighbours(node)) \
+			== sorted([q for p, q in edges if p == node]
+			          + [p for p, q in edges if q == node])
+	
+	edge_file = tmp_path / "edges.txt"
+	edge_file.write_text("".join(f"{p} {q}\n" for p, q in edges))
+	from_file = CSRGraph.from_edge_file(edge_file, chunk_size=100,
+	                                    nr_nodes=nr_nodes + 5)
+	assert all(from_file.neighbours(node) == graph.neighbours(node)
+	           for node in range(nr_nodes))
+	
+	components = _components(nr_nodes, edges)
+	component = max(components, key=len)
+	source = min(component)
+	distances = graph.bfs(source)
+	assert {node for node, distance in enumerate(distances)
+	        if distance >= 0} == component
+	for target in range(nr_nodes):
+		path = graph.shortest_path(source, target)
+		if target in component:
+			assert path is not None
+			_check_path(graph, path, distances[target])
+			assert path[0] == source and path[-1] == target
+			assert len(graph.shortest_path(source, target, False) or []) \
+				== len(path)
+		else:
+			assert path is None
+	assert graph.shortest_path(source, source) == [source]
+	with pytest.raises(IndexError):
+		graph.bfs(nr_nodes + 5)
+
+
+def test_directed_csr_graph() -> None:
+	nr_nodes = 300
+	edges = _random_edges(nr_nodes, 900)
+	graph = CSRGraph.from_edges(edges, directed=True)
+	assert graph.directed and graph.nr_edges == len(edges)
+	transpose = graph.transpose()
+	assert transpose.transpose() is graph
+	for node in range(len(graph)):
+		assert sorted(transpose.neighbours(node)) \
+			== sorted(p for p, q in edges if q == node)
+	
+	for source in range(0, len(graph), 10):
+		distances = graph.bfs(source)
+		for target in range(len(graph)):
+			path = graph.shortest_path(source, target)
+			if distances[target] < 0:
+				assert path is None
+			else:
+				assert path is not None
+				_check_path(graph, path, distances[target])
@@ -0,0 +1,154 @@
+"""Test of math_tools functions."""
+import cmath
+from array import array
+from fractions import Fraction
+from random import randint, sample, uniform
+
+import pytest
+
+from math_tools import Polynomial, horner_polynomial, \
+	horner_polynomial_many, iter_horner_polynomial, _naive_polynomial, \
+	_power, power_cache_info, set_power_cache_size, POWER_CACHE_SIZE
+
+
+def test_horner_polynomial_many() -> None:
+	coefficients = [randint(-10, 10) for _ in range(20)]
+	int_xs = [randint(-100, 100) for _ in range(1000)]
+	assert horner_polynomial_many(coefficients, int_xs) \
+		== [horner_polynomial(coefficients, x) for x in int_xs]
+	assert horner_polynomial_many([], int_xs) == [0] * len(int_xs)
+
+	float_xs = array("d", (uniform(-1, 1) for _ in range(1000)))
+	values = horner_polynomial_many(coefficients, float_xs)
+	assert isinstance(values, array) and values.typecode == "d"
+	assert values == pytest.approx([horner_polynomial(coefficients, x)
+	                                for x in float_xs])
+
+
+def test_horner_polynomial_many_numpy() -> None:
+	numpy = pytest.importorskip("numpy")
+	coefficients = [randint(-10, 10) for _ in range(20)]
+	xs = numpy.random.uniform(-1, 1, 1000)
+	values = horner_polynomial_many(coefficients, xs)
+	assert isinstance(values, numpy.ndarray)
+	assert values == pytest.approx([horner_polynomial(coefficients, x)
+	                                for x in xs.tolist()])
+
+
+def test_iter_horner_polynomial() -> None:
+	coefficients = [uniform(-10, 10) for _ in range(10)]
+	xs = array("d", (uniform(-1, 1) for _ in range(1000)))
+	expected = [horner_polynomial(coefficients, x) for x in xs]
+
+	chunks = list(iter_horner_polynomial(coefficients, xs, chunk_size=300))
+	assert list(map(len, chunks)) == [300, 300, 300, 100]
+	assert [value for chunk in chunks for value in chunk] \
+		== pytest.approx(expected)
+
+	chunks = list(iter_horner_polynomial(coefficients, iter(xs),
+	                                     chunk_size=256))
+	assert list(map(len, chunks)) == [256, 256, 256, 232]
+	assert [value for chunk in chunks for value in chunk] \
+		== pytest.approx(expected)
+
+	assert list(iter_horner_polynomial(coefficients, [])) == []
+	
+	int_coefficients = [randint(-10, 10) for _ in range(30)]
+	int_xs = (x for x in range(-500, 500))
+	assert [value for chunk in iter_horner_polynomial(int_coefficients,
+	                                                  int_xs, chunk_size=300)
+	        for value in chunk] \
+		== [horner_polynomial(int_coefficients, x) for x in range(-500, 500)]
+	assert next(iter_horner_polynomial([1, 0, 1], iter([1j, 2j]))) \
+		== [0, -3]
+	with pytest.raises(ValueError):
+		next(iter_horner_polynomial(coefficients, xs, chunk_size=0))
+
+
+def _schoolbook_product(a: Polynomial, b: Polynomial) -> list[int]:
+	product = [0] * (len(a.coefficients) + len(b.coefficients) - 1)
+	for i, a_i in enumerate(a.coefficients):
+		for j, b_j in enumerate(b.coefficients):
+			product[i + j] += a_i * b_j
+	return product
+
+
+def test_polynomial_arithmetic() -> None:
+	p = Polynomial([0, 3, 2, 1])
+	assert p.coefficients == (3, 2, 1) and p.degree == 2
+	assert p(2) == 17 and p.evaluate_many([0, 1, 2]) == [1, 6, 17]
+	assert p.derivative == Polynomial([6, 2]) and p.derivative is p.derivative
+	assert p - p == Polynomial() and Polynomial().degree == -1
+	assert 1 + p - 2 == Polynomial([3, 2, 0]) and 2 * p == p + p
+	assert -p == 0 - p == Polynomial([-3, -2, -1])
+	
+	for size in (3, 50, 100):
+		a = Polynomial([randint(-99, 99) for _ in range(size)])
+		b = Polynomial([randint(-99, 99) for _ in range(2 * size)])
+		assert (a * b).coefficients == tuple(_schoolbook_product(a, b))
+		fractions = Polynomial(map(Fraction, a.coefficients))
+		assert fractions * b == a * b
+		
+		quotient, remainder = divmod(b, a)
+		assert quotient * a + remainder == b
+		assert remainder.degree < a.degree
+		assert b // a == quotient and b % a == remainder
+	with pytest.raises(ZeroDivisionError):
+		divmod(p, Polynomial([0]))
+
+
+def test_polynomial_multipoint() -> None:
+	p = Polynomial([randint(-9, 9) for _ in range(200)])
+	xs = sample(range(-1000, 1000), 300)
+	assert p.evaluate_at(xs) == [p(x) for x in xs]
+	assert p.evaluate_at(xs, method="tree") == [p(x) for x in xs]
+	fraction_xs = [Fraction(x, 7) for x in xs[:100]]
+	assert p.evaluate_at(fraction_xs, "tree") == [p(x) for x in fraction_xs]
+	# Complex points are evaluated stably (by Horner) unless asked otherwise.
+	roots = [cmath.exp(2j * cmath.pi * k / 100) for k in range(100)]
+	assert p.evaluate_at(roots) == [p(x) for x in roots]
+	with pytest.raises(ValueError):
+		p.evaluate_at(xs, method="fft")
+	
+	xs = list(map(Fraction, sample(range(-100, 100), 100)))
+	ys = [Fraction(randint(-9, 9)) for _ in xs]
+	q = Polynomial.interpolate(xs, ys)
+	assert q.degree < len(xs)
+	assert q.evaluate_at(xs) == ys
+	assert Polynomial.interpolate(xs[:60], p.evaluate_at(xs[:60])) \
+		== Polynomial.interpolate(xs[:60], [p(x) for x in xs[:60]])
+	assert Polynomial.interpolate(list(range(10)),
+	                              [x * x - 1 for x in range(10)]) \
+		== Polynomial([1, 0, -1])
+	with pytest.raises(ValueError):
+		Polynomial.interpolate([1, 2, 1], [1, 2, 3])
+	with pytest.raises(ValueError):
+		Polynomial.interpolate([1, 2], [1])
+
+
+def test_power() -> None:
+	assert _power(3, 10_000) == 3 ** 10_000
+	assert _power(2, 0) == 1 and _power(0, 5) == 0.0 and _power(0, 0) == 1.0
+	assert _power(2, -3) == pytest.approx(1 / 8)
+	assert _power(1.5, 7.25) == pytest.approx(1.5 ** 7.25)
+	assert _power(9, 0.5) == pytest.approx(3)
+	with pytest.raises(ValueError):
+		_power(0, -1)
+	
+	coefficients = [randint(-10, 10) for _ in range(30)]
+	assert _naive_polynomial(coefficients, 7) \
+		== horner_polynomial(coefficients, 7)
+
+
+def test_power_cache() -> None:
+	try:
+		set_power_cache_size(8)
+		for exponent in range(100):
+			_power(3, exponent)
+		_power(3, 99)
+		info = power_cache_info()
+		assert info.maxsize == 8 and info.currsize == 8
+		assert info.misses == 100 and info.hits == 1
+	finally:
+		set_power_cache_size(POWER_CACHE_SIZE)
+	assert power_cache_info().currsize == 0
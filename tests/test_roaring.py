@@ -0,0 +1,55 @@
+"""Test of RoaringBitmap class."""
+from random import randrange, sample
+
+from roaring import RoaringBitmap
+
+
+def _random_bitmap(bit_nrs: set[int]) -> RoaringBitmap:
+	bitmap = RoaringBitmap()
+	for bit_nr in bit_nrs:
+		bitmap[bit_nr] = True
+	return bitmap
+
+
+def test_roaring_bitmap() -> None:
+	# sparse bits in a huge range, plus one dense chunk and one run
+	bit_nrs = {randrange(1 << 32) for _ in range(1000)}
+	bit_nrs |= set(sample(range(5 << 16, 6 << 16), 10000))
+	bit_nrs |= set(range(9 << 16, (9 << 16) + 30000))
+	bitmap = _random_bitmap(bit_nrs)
+	
+	assert len(bitmap) == 1 << 32
+	assert bitmap.count() == len(bit_nrs)
+	assert list(bitmap.iter_set()) == sorted(bit_nrs)
+	for bit_nr in sample(sorted(bit_nrs), 100):
+		assert bitmap[bit_nr]
+	assert bitmap.nbytes < 100000
+	
+	nbytes = bitmap.nbytes
+	bitmap.run_optimize()
+	assert bitmap.nbytes < nbytes
+	assert list(bitmap.iter_set()) == sorted(bit_nrs)
+	
+	for bit_nr in sample(sorted(bit_nrs), 9000):
+		bitmap[bit_nr] = False
+		bit_nrs.remove(bit_nr)
+	assert list(bitmap.iter_set()) == sorted(bit_nrs)
+	assert RoaringBitmap.from_bytes(bitmap.to_bytes()) == bitmap
+
+
+def test_roaring_set_operations() -> None:
+	bit_nrs_1 = {randrange(1 << 20) for _ in range(20000)}
+	bit_nrs_2 = {randrange(1 << 20) for _ in range(20000)}
+	bitmap_1 = _random_bitmap(bit_nrs_1)
+	bitmap_2 = _random_bitmap(bit_nrs_2)
+	
+	assert list((bitmap_1 | bitmap_2).iter_set()) \
+	       == sorted(bit_nrs_1 | bit_nrs_2)
+	assert list((bitmap_1 & bitmap_2).iter_set()) \
+	       == sorted(bit_nrs_1 & bit_nrs_2)
+	
+	bitmap_2.run_optimize()
+	bitmap_1 &= bitmap_2
+	assert list(bitmap_1.iter_set()) == sorted(bit_nrs_1 & bit_nrs_2)
+	bitmap_1 |= bitmap_2
+	assert list(bitmap_1.iter_set()) == sorted(bit_nrs_2)